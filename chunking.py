@@ -0,0 +1,163 @@
+import os
+import re
+from functools import lru_cache
+from typing import List, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Most tokens in a chunk (the embedding models accept 8191)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "800"))
+# Tokens of trailing sentences repeated at the start of the next chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+# tiktoken encoding of the OpenAI embedding models
+CHUNK_ENCODING = os.getenv("CHUNK_ENCODING", "cl100k_base")
+
+# A judgment paragraph starts after a blank line or with its number: "12.", "(a)", "[3]"
+_PARAGRAPH_START = re.compile(r"^\s*(?:\d{1,3}\.(?!\d)|\(\w{1,4}\)|\[\d{1,3}\])\s")
+# Sentence ends: ., ! or ? (optionally closing a quote or bracket) before whitespace and
+# a capital, digit, quote or bracket
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]?\s+(?=[A-Z0-9\"'(\[])")
+# Abbreviations common in judgments and citations that don't end a sentence
+ABBREVIATIONS = {
+    "v", "vs", "no", "nos", "hon", "j", "cj", "jj", "pc", "art", "arts", "s", "ss", "sec", "secs",
+    "para", "paras", "mr", "mrs", "ms", "dr", "st", "ltd", "pvt", "co", "inc", "e.g", "i.e", "etc",
+    "cf", "viz", "ibid", "supra", "vol", "pp", "p", "ch", "reg", "regs", "cap", "sc", "ca", "nlr", "slr"
+}
+_LAST_WORD = re.compile(r"([\w.]+)\.$")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = CHUNK_ENCODING):
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+
+def paragraphs(text: str) -> List[str]:
+    """
+    Paragraphs of extracted judgment text. PDF extraction breaks every line, so
+    lines are rejoined; a paragraph ends at a blank line or where the next line
+    starts with a paragraph number.
+    """
+    result, current = [], []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or _PARAGRAPH_START.match(line):
+            if current:
+                result.append(" ".join(current))
+                current = []
+        if line:
+            current.append(line)
+    if current:
+        result.append(" ".join(current))
+    return result
+
+
+def sentences(paragraph: str) -> List[str]:
+    """Split a paragraph into sentences, keeping "v.", "No.", "Art." and initials attached."""
+    pieces, start = [], 0
+    for match in _SENTENCE_END.finditer(paragraph):
+        candidate = paragraph[start:match.start()].rstrip("\"')]")
+        last_word = _LAST_WORD.search(candidate)
+        if last_word and (last_word.group(1).lower() in ABBREVIATIONS or len(last_word.group(1)) == 1):
+            continue
+        pieces.append(paragraph[start:match.start()].strip() + match.group(0).strip())
+        start = match.end()
+    pieces.append(paragraph[start:].strip())
+    return [piece for piece in pieces if piece]
+
+
+class TokenChunker:
+    """
+    Splits documents into chunks of at most max_tokens (tiktoken) tokens,
+    breaking at paragraph boundaries where possible and otherwise between
+    sentences; only a single sentence longer than a chunk is cut mid-sentence.
+    Consecutive chunks share up to overlap_tokens of whole sentences.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 encoding: str = CHUNK_ENCODING):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding_name = encoding
+
+    @property
+    def signature(self) -> str:
+        """Identifies the chunking, so documents are re-ingested when it changes."""
+        return f"tokens:{self.encoding_name}:{self.max_tokens}:{self.overlap_tokens}"
+
+    def count(self, text: str) -> int:
+        return len(get_encoding(self.encoding_name).encode(text))
+
+    def _units(self, paragraph: str) -> List[Tuple[str, int]]:
+        """Sentences of a paragraph with their token counts, none above max_tokens."""
+        units = []
+        for sentence in sentences(paragraph):
+            # One token for the separator it is joined with
+            tokens = self.count(sentence) + 1
+            if tokens <= self.max_tokens:
+                units.append((sentence, tokens))
+                continue
+            encoding = get_encoding(self.encoding_name)
+            encoded = encoding.encode(sentence)
+            step = self.max_tokens - 1
+            for i in range(0, len(encoded), step):
+                piece = encoding.decode(encoded[i:i + step]).strip()
+                if piece:
+                    units.append((piece, len(encoded[i:i + step]) + 1))
+        return units
+
+    def split(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        # (sentence, tokens, starts a paragraph) of the chunk being built
+        current: List[Tuple[str, int, bool]] = []
+        size = 0
+        fresh = 0  # units not carried over from the previous chunk
+
+        def flush():
+            nonlocal current, size, fresh
+            chunks.append(" ".join(
+                ("\n\n" if starts_paragraph and i else "") + sentence
+                for i, (sentence, _, starts_paragraph) in enumerate(current)
+            ).replace(" \n\n", "\n\n"))
+            # Carry the trailing sentences into the next chunk as overlap
+            tail, tail_size = [], 0
+            for unit in reversed(current):
+                if tail_size + unit[1] > self.overlap_tokens:
+                    break
+                tail.insert(0, unit)
+                tail_size += unit[1]
+            current, size, fresh = tail, tail_size, 0
+
+        for paragraph in paragraphs(text):
+            units = self._units(paragraph)
+            paragraph_size = sum(tokens for _, tokens in units)
+            # Start a paragraph that fits in a chunk on a new chunk rather than
+            # splitting it, unless the current chunk is still mostly empty
+            if fresh and size + paragraph_size > self.max_tokens and size >= self.max_tokens // 2:
+                flush()
+            for i, (sentence, tokens) in enumerate(units):
+                if fresh and size + tokens > self.max_tokens:
+                    flush()
+                if size + tokens > self.max_tokens:
+                    # Not even the overlap fits alongside this sentence
+                    current, size = [], 0
+                current.append((sentence, tokens, i == 0))
+                size += tokens
+                fresh += 1
+        if fresh:
+            flush()
+        return chunks
+
+    def chunk_pages(self, pages: List[str]) -> List[str]:
+        """Chunk a document given page by page; chunks may span pages."""
+        return self.split("\n\n".join(pages))
+
+
+@lru_cache(maxsize=1)
+def get_chunker() -> TokenChunker:
+    """The chunker configured from the environment, shared by the ingestion scripts."""
+    return TokenChunker()
@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# OpenAI accepts up to 2048 inputs / ~300k tokens per embeddings request; stay well below
+MAX_BATCH_TOKENS = 50000
+MAX_BATCH_ITEMS = 256
+MAX_RETRIES = 6
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def token_budget_batches(items: Iterable[T], text_of: Callable[[T], str] = lambda item: item,
+                         max_tokens: int = MAX_BATCH_TOKENS, max_items: int = MAX_BATCH_ITEMS) -> Iterator[List[T]]:
+    """
+    Group a (possibly lazy) stream of items into batches whose estimated token
+    count and size stay within the budget. Only one batch is held at a time.
+    """
+    batch: List[T] = []
+    batch_tokens = 0
+    for item in items:
+        tokens = estimate_tokens(text_of(item))
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return status == 429 or "rate limit" in str(error).lower() or type(error).__name__ == "RateLimitError"
+
+
+class AdaptiveLimiter:
+    """
+    Request pacing shared by concurrent workers. A rate-limit error anywhere
+    widens the interval between everyone's requests; each success narrows it
+    again, so throughput settles just below the provider's limit instead of
+    every worker hammering it and backing off independently.
+    """
+
+    def __init__(self, max_interval: float = 30.0):
+        self.max_interval = max_interval
+        self.interval = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def success(self):
+        with self._lock:
+            self.interval = self.interval * 0.8 if self.interval > 0.05 else 0.0
+
+    def throttled(self):
+        with self._lock:
+            self.interval = min(self.max_interval, max(0.5, self.interval * 2))
+
+
+def call_with_backoff(fn: Callable[..., T], *args, max_retries: int = MAX_RETRIES,
+                      limiter: Optional[AdaptiveLimiter] = None, **kwargs) -> T:
+    """
+    Call fn, retrying rate-limit errors with exponential backoff and jitter.
+    Other errors are raised immediately. With a limiter, the call is also
+    paced together with the other workers sharing it.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            if limiter is not None:
+                limiter.throttled()
+            delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+            print(f"Rate limited ({str(e)}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            if limiter is not None:
+                limiter.success()
+            return result
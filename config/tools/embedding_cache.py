@@ -0,0 +1,150 @@
+import array
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Dict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# In-memory entries kept per process
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+# Optional on-disk tier shared across processes and restarts (empty disables it)
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different query strings share an entry."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Process-wide embedding cache keyed by model + normalized text: an in-memory
+    LRU in front of an optional SQLite table. Vectors are kept as packed
+    float32 (array('f')) in memory and on disk, about an eighth of the size of a
+    list of Python floats, and returned as lists.
+    """
+
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, db_path: Optional[str] = EMBEDDING_CACHE_DB):
+        self.max_size = max_size
+        self.db_path = db_path or None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, array.array]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.db_path:
+            conn = self._connect()
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            finally:
+                conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _remember(self, key: str, vector: array.array):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """Cached vectors for the texts that have one, keyed by text."""
+        found = {}
+        missing = {}
+        with self._lock:
+            for text in texts:
+                key = cache_key(model, text)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[text] = self._entries[key].tolist()
+                else:
+                    missing[key] = text
+
+        if missing and self.db_path:
+            conn = self._connect()
+            try:
+                placeholders = ",".join("?" for _ in missing)
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", list(missing)
+                ).fetchall()
+            finally:
+                conn.close()
+            for key, blob in rows:
+                vector = array.array("f", blob)
+                self._remember(key, vector)
+                found[missing[key]] = vector.tolist()
+
+        self.hits += len(found)
+        self.misses += len(set(texts)) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        """Store vectors keyed by text."""
+        rows = []
+        for text, vector in vectors.items():
+            key = cache_key(model, text)
+            packed = array.array("f", vector)
+            self._remember(key, packed)
+            rows.append((key, packed.tobytes()))
+
+        if rows and self.db_path:
+            conn = self._connect()
+            try:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            finally:
+                conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    """The cache shared by every search tool in this process."""
+    return EmbeddingCache()
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings client so that queries already embedded by any
+    tool in the process (or stored on disk) cost no API round trip. Misses in a
+    batch are embedded with a single request.
+    """
+
+    def __init__(self, embeddings, model: str, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        found = self.cache.get_many(self.model, texts)
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+        return [found[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        found = self.cache.get_many(self.model, [text])
+        if text in found:
+            return found[text]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model, {text: vector})
+        return vector
@@ -1,19 +1,41 @@
-from typing import Type, List, Dict, Any, Optional
+from typing import Type, List, Dict, Any, Optional, Union, Iterable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field, PrivateAttr
 from pinecone import Pinecone, ServerlessSpec
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config.tools.embedding_cache import CachedEmbeddings
+from config.tools.result_formatter import ResultFormatter
+from config.tools.vector_backends import VectorBackend
+from config.tools.hybrid_search import extract_metadata_from_query, filtered_query, payload_matches
+from config.tools.query_metadata import Filters
+from config.tools.sparse_index import BM25Index, FusionSearch
+from config.tools.reranker import Reranker
+from config.tools.embedding_batches import token_budget_batches, call_with_backoff, MAX_BATCH_TOKENS
 import os
 from dotenv import load_dotenv
-import json
+import hashlib
+import math
 
 # Load environment variables
 load_dotenv()
 
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Ids per fetch request when checking which chunks are already indexed (fetch is a GET
+# with the ids in the URL, so large batches exceed its length limit)
+FETCH_BATCH_SIZE = 100
+
+def chunk_id(text: str) -> str:
+    """Content-derived vector id: the same chunk always maps to the same id."""
+    return "chunk_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
 class DocumentSearchInput(BaseModel):
     """Input schema for DocumentSearchTool."""
-    query: str = Field(..., description="The query to search in the knowledge base.")
+    query: Union[str, List[str]] = Field(
+        ...,
+        description="The query to search in the knowledge base, or a list of queries to run together in one call."
+    )
     top_k: int = Field(default=3, description="Number of most relevant documents to retrieve.")
 
 class DocumentSearchTool(BaseTool):
@@ -22,12 +44,20 @@ class DocumentSearchTool(BaseTool):
     A tool for searching through documents using semantic search.
     Returns relevant text passages based on the query.
     Use this tool to find relevant information from the knowledge base.
+    Pass a list of queries to search for all of them in a single call.
     """
     args_schema: Type[BaseModel] = DocumentSearchInput
 
     _pc: Pinecone = PrivateAttr()
     _index: object = PrivateAttr()
     _namespace: str = PrivateAttr()
+    _namespaces: List[str] = PrivateAttr()
+    _namespace_quota: Optional[int] = PrivateAttr()
+    _formatter: ResultFormatter = PrivateAttr()
+    _metadata_filters: bool = PrivateAttr()
+    _sparse_index: Optional[BM25Index] = PrivateAttr()
+    _reranker: Optional[Reranker] = PrivateAttr()
+    _rerank_candidates: int = PrivateAttr()
     _top_k: int = PrivateAttr()
     _similarity_threshold: float = PrivateAttr()
     _embeddings: object = PrivateAttr()
@@ -38,9 +68,37 @@ class DocumentSearchTool(BaseTool):
         environment: str,
         top_k: int = 5,
         similarity_threshold: float = 0.7,
-        namespace: str = ""
+        namespace: Union[str, List[str]] = "",
+        namespace_quota: Optional[int] = None,
+        formatter: Optional[ResultFormatter] = None,
+        backend: Optional[VectorBackend] = None,
+        embedding_model: str = EMBEDDING_MODEL,
+        metadata_filters: bool = False,
+        sparse_index: Optional[BM25Index] = None,
+        reranker: Optional[Reranker] = None,
+        rerank_candidates: int = 3
     ):
-        """Initialize the tool with the given parameters."""
+        """Initialize the tool with the given parameters.
+
+        Args:
+            namespace: A namespace, or a list of namespaces searched together with
+                one query embedding and concurrent index queries.
+            namespace_quota: Results each namespace is guaranteed when searching
+                several (up to top_k in total); a namespace with fewer matches
+                leaves its share to the others. Defaults to an even share of top_k.
+            formatter: Serializes results for the agent. Defaults to a
+                ResultFormatter configured from the environment.
+            backend: Vector store to search instead of the Pinecone index, e.g.
+                a LocalVectorBackend built from an export of it.
+            embedding_model: OpenAI model the index's vectors were created with.
+            metadata_filters: Push judge / case type / tag filters found in the
+                query down to the index, so filtered queries return their exact top_k.
+            sparse_index: BM25 index over the same chunks and ids as the (single)
+                namespace; results then fuse dense and sparse ranks.
+            reranker: Reorders each query's results by relevance, scoring all
+                its candidates in one call (see config.tools.reranker.get_reranker).
+            rerank_candidates: Candidates retrieved per result kept when reranking.
+        """
         super().__init__()
         
         # Initialize private attributes
@@ -48,86 +106,277 @@ class DocumentSearchTool(BaseTool):
         self._environment = environment
         self._top_k = top_k
         self._similarity_threshold = similarity_threshold
-        self._namespace = namespace
+        self._namespaces = [namespace] if isinstance(namespace, str) else list(namespace)
+        # add_documents writes to the first namespace
+        self._namespace = self._namespaces[0]
+        self._namespace_quota = namespace_quota
+        self._formatter = formatter or ResultFormatter()
+        self._metadata_filters = metadata_filters
+        self._sparse_index = sparse_index
+        self._reranker = reranker
+        self._rerank_candidates = rerank_candidates
         
-        # Initialize Pinecone
-        self._pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self._index = self._pc.Index(index_name)
+        if backend is not None:
+            self._pc = None
+            self._index = backend
+        else:
+            # Initialize Pinecone
+            self._pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+            self._index = self._pc.Index(index_name)
         
-        # Initialize OpenAI embeddings
-        self._embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
+        # Initialize OpenAI embeddings behind the process-wide embedding cache,
+        # shared with the other search tools
+        self._embeddings = CachedEmbeddings(
+            OpenAIEmbeddings(
+                model=embedding_model,
+                openai_api_key=os.getenv("OPENAI_API_KEY")
+            ),
+            model=embedding_model
         )
 
-    def _run(self, query: str, top_k: Optional[int] = None) -> str:
-        """Run the tool on the given query."""
+    def _run(self, query: Union[str, List[str]], top_k: Optional[int] = None) -> str:
+        """Run the tool on the given query (or list of queries)."""
         try:
+            if not isinstance(query, str):
+                return self._formatter.format(self._search_batch(list(query), top_k), list(query))
+
             # Generate embedding for the query using OpenAI
-            response = self._embeddings.embed_query(query)
-            query_embedding = response
+            query_embedding = self._embeddings.embed_query(query)
 
             # Use the provided top_k if specified, otherwise use the default
             k = top_k if top_k is not None else self._top_k
+            return self._formatter.format(self._search_query(query, query_embedding, k), query)
 
+        except Exception as e:
+            return f"Error searching documents: {str(e)}"
+
+    def _search_query(self, query: str, query_embedding: List[float], k: int) -> List[Dict[str, Any]]:
+        """
+        The top k results of one query: dense matches (fused with BM25 matches
+        when there is a sparse index), reranked when there is a reranker.
+        """
+        keep = k
+        if self._reranker is not None:
+            # Retrieve a wider candidate set and keep the k the reranker scores highest
+            k = k * self._rerank_candidates
+
+        filters = self._filter_for(query)
+        if len(self._namespaces) == 1 and self._sparse_index is not None:
+            results = self._search_fused(query, query_embedding, k, filters)
+        elif len(self._namespaces) == 1:
+            results = self._search_namespace(query_embedding, k, self._namespace, filters)
+        else:
+            results = self._search_namespaces(query_embedding, k, filters)
+
+        if self._reranker is not None:
+            results = self._reranker.rerank(query, results, keep)
+        return results
+
+    def _filter_for(self, query: str) -> Optional[Filters]:
+        """Metadata filters extracted from the query, when metadata filtering is enabled."""
+        if not self._metadata_filters:
+            return None
+        return extract_metadata_from_query(query) or None
+
+    def _query_matches(self, query_embedding: List[float], k: int, namespace: str,
+                       filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """Query one namespace and keep the matches above the similarity threshold."""
+        def query(n, native_filter):
             # Search Pinecone
             results = self._index.query(
                 vector=query_embedding,
-                top_k=k,
-                namespace=self._namespace,
+                top_k=n,
+                namespace=namespace,
+                filter=native_filter,
                 include_metadata=True
             )
+            return [
+                {'id': match.id, 'score': match.score, 'metadata': match.metadata or {}}
+                for match in results.matches if match.score >= self._similarity_threshold
+            ]
 
-            # Format results
-            formatted_results = []
-            for match in results.matches:
-                if match.score >= self._similarity_threshold:
-                    result = {
-                        'text': match.metadata.get('text', ''),
-                        'score': match.score,
-                        'metadata': match.metadata
-                    }
-                    formatted_results.append(result)
+        return filtered_query(query, k, filters)
 
-            return json.dumps(formatted_results, indent=2)
+    def _search_namespace(self, query_embedding: List[float], k: int, namespace: str,
+                          filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        # Format results
+        formatted_results = []
+        for match in self._query_matches(query_embedding, k, namespace, filters):
+            result = {
+                'id': match['id'],
+                'text': match['metadata'].get('text', ''),
+                'score': match['score'],
+                'metadata': match['metadata']
+            }
+            formatted_results.append(result)
+        return formatted_results
 
-        except Exception as e:
-            return f"Error searching documents: {str(e)}"
+    def _search_fused(self, query: str, query_embedding: List[float], k: int,
+                      filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """
+        Reciprocal-rank fusion of the dense matches and the BM25 matches, so exact
+        case numbers, judge names and citations are found even when the embedding
+        misses them. Scores are fused ranks, not similarities.
+        """
+        def dense_search(_, n):
+            return self._query_matches(query_embedding, n, self._namespace, filters)
 
-    def add_documents(self, texts: List[str], chunk_size: int = 500, chunk_overlap: int = 50) -> None:
+        fusion = FusionSearch(dense_search, self._sparse_index)
+        fused = fusion.search(query, k, lambda payload: payload_matches(payload, filters))
+        return [
+            {'id': result['id'], 'text': result['metadata'].get('text', ''), 'score': result['score'], 'metadata': result['metadata']}
+            for result in fused
+        ]
+
+    def _search_namespaces(self, query_embedding: List[float], k: int,
+                           filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """
+        Query every namespace concurrently with the same embedding and return
+        the best k results: each namespace first gets up to its quota, and
+        slots a namespace can't fill go to the best remaining results of the
+        others.
+        """
+        quota = self._namespace_quota or math.ceil(k / len(self._namespaces))
+        with ThreadPoolExecutor(max_workers=len(self._namespaces)) as executor:
+            # Each namespace is asked for k so it can take up quota the others leave unused
+            per_namespace = executor.map(
+                lambda namespace: (namespace, self._search_namespace(query_embedding, k, namespace, filters)),
+                self._namespaces
+            )
+            selected, remaining = [], []
+            for namespace, results in per_namespace:
+                for result in results:
+                    result['namespace'] = namespace
+                selected.extend(results[:quota])
+                remaining.extend(results[quota:])
+        by_score = lambda result: result['score']
+        selected = sorted(selected, key=by_score, reverse=True)[:k]
+        if len(selected) < k:
+            selected.extend(sorted(remaining, key=by_score, reverse=True)[:k - len(selected)])
+            selected.sort(key=by_score, reverse=True)
+        return selected
+
+    def _search_batch(self, queries: List[str], top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run several queries in one call: embed them with a single request, run
+        the queries concurrently (each fused and reranked like a single query)
+        and merge results found by more than one query into one result that
+        lists the queries it answered.
+        """
+        queries = list(dict.fromkeys(queries))
+        if not queries:
+            return {'queries': [], 'results': []}
+
+        k = top_k if top_k is not None else self._top_k
+        embeddings = self._embeddings.embed_documents(queries)
+
+        with ThreadPoolExecutor(max_workers=min(len(queries), 8)) as executor:
+            found = executor.map(
+                lambda i: (i, self._search_query(queries[i], embeddings[i], k)),
+                range(len(queries))
+            )
+            merged: Dict[tuple, Dict[str, Any]] = {}
+            for i, results in found:
+                for result in results:
+                    key = (result.get('namespace', self._namespace), result['id'])
+                    if key not in merged:
+                        # The passage text is returned once, not repeated inside metadata
+                        merged[key] = {
+                            'text': result['text'],
+                            'score': result['score'],
+                            'metadata': {name: value for name, value in result['metadata'].items() if name != 'text'},
+                            'queries': []
+                        }
+                        if 'namespace' in result:
+                            merged[key]['namespace'] = result['namespace']
+                    merged[key]['score'] = max(merged[key]['score'], result['score'])
+                    if 'rerank_score' in result:
+                        merged[key]['rerank_score'] = max(merged[key].get('rerank_score', result['rerank_score']),
+                                                          result['rerank_score'])
+                    merged[key]['queries'].append(i)
+
+        rank = 'rerank_score' if self._reranker is not None else 'score'
+        results = sorted(merged.values(), key=lambda result: result.get(rank, result['score']), reverse=True)
+        return {'queries': queries, 'results': results}
+
+    def add_documents(self, texts: Iterable[str], chunk_size: int = 500, chunk_overlap: int = 50,
+                      max_batch_tokens: int = MAX_BATCH_TOKENS, concurrency: int = 4) -> Dict[str, int]:
         """Add documents to the search index.
         
+        Texts are chunked lazily and embedded in token-budgeted batches, several
+        batches at a time, each upserted as soon as it is embedded, so memory
+        stays bounded however many texts are indexed. Chunk ids are derived from
+        the chunk text, so re-indexing the same texts embeds and upserts nothing.
+        
         Args:
-            texts (List[str]): List of text documents to add
+            texts (Iterable[str]): Text documents to add (may be a generator)
             chunk_size (int): Size of text chunks
             chunk_overlap (int): Overlap between chunks
+            max_batch_tokens (int): Estimated tokens per embeddings request
+            concurrency (int): Batches embedded/upserted at the same time
+        
+        Returns:
+            Dict[str, int]: Number of chunks seen, embedded and skipped as already indexed
         """
         # Split texts into chunks
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
-        chunks = []
-        for text in texts:
-            chunks.extend(text_splitter.split_text(text))
         
-        # Get embeddings for chunks
-        embeddings = self._embeddings.embed_documents(chunks)
+        def chunks():
+            for text in texts:
+                for chunk in text_splitter.split_text(text):
+                    yield chunk_id(chunk), chunk
         
-        # Prepare vectors for upserting
-        vectors = []
-        for i, (embedding, chunk) in enumerate(zip(embeddings, chunks)):
-            vectors.append({
-                'id': f'chunk_{i}',
-                'values': embedding,
-                'metadata': {'text': chunk}
-            })
+        stats = {'chunks': 0, 'embedded': 0, 'skipped': 0}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = set()
+            for batch in token_budget_batches(chunks(), text_of=lambda item: item[1], max_tokens=max_batch_tokens):
+                # Bound the batches held in memory to the ones being worked on
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._add_batch_stats(stats, future.result())
+                in_flight.add(executor.submit(self._index_batch, batch))
+            for future in in_flight:
+                self._add_batch_stats(stats, future.result())
+        return stats
+
+    @staticmethod
+    def _add_batch_stats(stats: Dict[str, int], batch_stats: Dict[str, int]):
+        for name, count in batch_stats.items():
+            stats[name] += count
+
+    def _index_batch(self, batch: List[tuple]) -> Dict[str, int]:
+        """Embed and upsert the chunks of one batch that are not in the index yet."""
+        # Deduplicate within the batch, then skip chunks already stored by an earlier run
+        batch = list(dict(batch).items())
+        existing = set()
+        for i in range(0, len(batch), FETCH_BATCH_SIZE):
+            existing.update(call_with_backoff(
+                self._index.fetch, ids=[id_ for id_, _ in batch[i:i + FETCH_BATCH_SIZE]], namespace=self._namespace
+            ).vectors)
+        pending = [(id_, chunk) for id_, chunk in batch if id_ not in existing]
+        
+        if pending:
+            # Documents bypass the query embedding cache
+            embeddings = call_with_backoff(
+                self._embeddings.embeddings.embed_documents, [chunk for _, chunk in pending]
+            )
+            vectors = [
+                {'id': id_, 'values': embedding, 'metadata': {'text': chunk}}
+                for (id_, chunk), embedding in zip(pending, embeddings)
+            ]
+            
+            # Upsert to Pinecone in batches
+            upsert_batch_size = 100
+            for i in range(0, len(vectors), upsert_batch_size):
+                call_with_backoff(
+                    self._index.upsert, vectors=vectors[i:i + upsert_batch_size], namespace=self._namespace
+                )
         
-        # Upsert to Pinecone in batches
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self._index.upsert(vectors=batch, namespace=self._namespace)
+        return {'chunks': len(batch), 'embedded': len(pending), 'skipped': len(batch) - len(pending)}
 
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embeddings for the given text."""
@@ -0,0 +1,326 @@
+import ast
+import json
+from typing import Callable, Dict, List, Optional, Union, Any
+
+from config.tools.query_metadata import Filters, JUDGE_TITLES, get_query_extractor, words
+from config.tools.sparse_index import BM25Index, FusionSearch
+
+# Payload fields matched by token (the stored value is a name, a list of tags or a
+# stringified list, and the query names part of it) ...
+TEXT_FILTER_FIELDS = [
+    "judges", "case_type", "case_subtype",
+    "process_tags", "behaviour_tags", "outcome_tags", "criminal_tags",
+    "labor_tags", "property_tags", "commercial_tags", "fundamental_right_tags"
+]
+# ... and fields matched exactly
+KEYWORD_FILTER_FIELDS = ["court", "case_number"]
+# Fields a filter value only has to occur in (a judge's full name and title, or one
+# tag of a list); the others must equal one of the stored values
+SUBSTRING_FILTER_FIELDS = [field for field in TEXT_FILTER_FIELDS if field != "case_type"]
+# Candidates retrieved per result when filters are applied after the query
+FILTER_OVERFETCH = 3
+# Normalized copies of the filter fields stored at ingest, as "filter_<field>" lists of
+# terms (see payload_filter_terms), so filters match exact terms in one pushed-down query
+FILTER_TERMS_PREFIX = "filter_"
+FILTER_TERMS_VERSION_FIELD = "filter_terms_version"
+FILTER_TERMS_VERSION = 1
+
+
+def extract_metadata_from_query(query: str) -> Filters:
+    """Extract structured metadata filters from a natural language query."""
+    return get_query_extractor().extract(query)
+
+
+def filter_values(value: Union[str, List[str]]) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+def case_variants(value: str) -> List[str]:
+    return list(dict.fromkeys([value, value.lower(), value.title(), value.upper()]))
+
+
+def normalized_values(stored) -> List[str]:
+    """A stored metadata value as lowercase strings: a scalar, a list or a stringified list like "['civil']"."""
+    if isinstance(stored, str) and stored.startswith("["):
+        try:
+            stored = ast.literal_eval(stored)
+        except (ValueError, SyntaxError):
+            pass
+    values = stored if isinstance(stored, (list, tuple, set)) else [stored]
+    return [str(value).strip().lower() for value in values if value is not None and str(value).strip()]
+
+
+def value_matches(field: str, accepted: List[str], stored) -> bool:
+    """Whether one stored field value satisfies a filter on that field (any accepted value)."""
+    stored_values = normalized_values(stored)
+    accepted = [value.lower() for value in accepted]
+    if field in SUBSTRING_FILTER_FIELDS:
+        return any(value in stored_value for value in accepted for stored_value in stored_values)
+    return any(stored_value in accepted for stored_value in stored_values)
+
+
+def filter_terms(field: str, stored) -> List[str]:
+    """
+    The terms a stored field value is filtered on: each item lowercased with
+    punctuation and underscores as spaces. Judge names also drop their titles
+    and add every two consecutive words, which is how queries name a judge
+    ("Hon. Janak De Silva, J." -> "janak de silva", "janak de", "de silva").
+    """
+    terms = []
+    for item in normalized_values(stored):
+        item_words = words(item.replace("_", " "))
+        runs = []
+        if field == "judges":
+            item_words = [word for word in item_words if word not in JUDGE_TITLES]
+            runs = [" ".join(item_words[i:i + 2]) for i in range(len(item_words) - 1)]
+        for term in [" ".join(item_words)] + runs:
+            if term and term not in terms:
+                terms.append(term)
+    return terms
+
+
+def query_terms(field: str, value: Union[str, List[str]]) -> List[str]:
+    """The terms accepted by a filter on a field: one per filter value."""
+    terms = []
+    for v in filter_values(value):
+        term = filter_terms(field, v)[:1]
+        terms.extend(t for t in term if t not in terms)
+    return terms
+
+
+def payload_filter_terms(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The filter term fields to store with a payload (list fields are exact-match indexable everywhere)."""
+    terms: Dict[str, Any] = {
+        FILTER_TERMS_PREFIX + field: filter_terms(field, payload.get(field))
+        for field in TEXT_FILTER_FIELDS + KEYWORD_FILTER_FIELDS if field in payload
+    }
+    terms[FILTER_TERMS_VERSION_FIELD] = FILTER_TERMS_VERSION
+    return terms
+
+
+def payload_matches(payload: Dict[str, Any], filters: Optional[Filters], terms: bool = False) -> bool:
+    """
+    The definition of a result matching extracted filters, applied to every
+    result whichever store it came from. With terms, a field matches when one
+    of its stored filter terms is a filter value's term. Otherwise values are
+    compared case-insensitively against the stored value, list or stringified
+    list; judge names and tags only have to occur in a stored value, other
+    fields must equal one.
+    """
+    if terms:
+        return all(
+            set(query_terms(field, value)) & set(payload.get(FILTER_TERMS_PREFIX + field) or [])
+            for field, value in (filters or {}).items()
+        )
+    return all(value_matches(field, filter_values(value), payload.get(field)) for field, value in (filters or {}).items())
+
+
+# ---------------------- Qdrant ------------------------
+def qdrant_filter(filters: Filters, terms: bool = False):
+    """
+    Translate extracted filters into a native Qdrant filter: every field must
+    match, and a field given several values matches any of them. With terms
+    the stored filter terms are matched exactly; otherwise text fields use
+    full-text matching. Both need the payload indexes created by
+    ensure_payload_indexes.
+    """
+    from qdrant_client import models
+
+    conditions = []
+    for field, value in filters.items():
+        if terms:
+            conditions.append(models.FieldCondition(
+                key=FILTER_TERMS_PREFIX + field, match=models.MatchAny(any=query_terms(field, value))
+            ))
+            continue
+        values = filter_values(value)
+        if field in KEYWORD_FILTER_FIELDS:
+            variants = [variant for v in values for variant in case_variants(v)]
+            conditions.append(models.FieldCondition(key=field, match=models.MatchAny(any=variants)))
+        else:
+            options = [models.FieldCondition(key=field, match=models.MatchText(text=v)) for v in values]
+            conditions.append(options[0] if len(options) == 1 else models.Filter(should=options))
+    return models.Filter(must=conditions) if conditions else None
+
+
+def ensure_payload_indexes(client, collection_name: str):
+    """Create the payload indexes the judgment filters run on (no-op when they exist)."""
+    from qdrant_client import models
+
+    existing = client.get_collection(collection_name).payload_schema or {}
+    text_index = models.TextIndexParams(
+        type=models.TextIndexType.TEXT,
+        tokenizer=models.TokenizerType.WORD,
+        lowercase=True
+    )
+    for field in TEXT_FILTER_FIELDS:
+        if field not in existing:
+            client.create_payload_index(collection_name, field_name=field, field_schema=text_index)
+    keyword_fields = KEYWORD_FILTER_FIELDS + [FILTER_TERMS_PREFIX + field for field in TEXT_FILTER_FIELDS + KEYWORD_FILTER_FIELDS]
+    for field in keyword_fields:
+        if field not in existing:
+            client.create_payload_index(collection_name, field_name=field, field_schema=models.PayloadSchemaType.KEYWORD)
+
+
+def add_filter_terms(client, collection_name: str, batch_size: int = 256) -> int:
+    """
+    Store the filter terms on the points of a collection that don't have them
+    yet (ingested before they were added). Returns the number of points updated.
+    """
+    from qdrant_client import models
+
+    missing = models.Filter(must=[
+        models.IsEmptyCondition(is_empty=models.PayloadField(key=FILTER_TERMS_VERSION_FIELD))
+    ])
+    updated = 0
+    while True:
+        # Updated points leave the filter, so the first page is always the next one
+        points, _ = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=missing,
+            limit=batch_size,
+            with_payload=True,
+            with_vectors=False
+        )
+        if not points:
+            return updated
+        # Chunks of one judgment share their metadata, so they are updated together
+        groups: Dict[str, List] = {}
+        for point in points:
+            terms = payload_filter_terms(point.payload or {})
+            groups.setdefault(json.dumps(terms, sort_keys=True), []).append(point.id)
+        for key, ids in groups.items():
+            client.set_payload(collection_name=collection_name, payload=json.loads(key), points=ids)
+        updated += len(points)
+
+
+# ---------------------- Pinecone ------------------------
+def pinecone_filter(filters: Filters, terms: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Translate extracted filters into a Pinecone metadata filter. With terms
+    the stored filter terms are matched; otherwise Pinecone only matches whole
+    values, so each value is also tried in its common casings.
+    """
+    conditions = []
+    for field, value in filters.items():
+        if terms:
+            conditions.append({FILTER_TERMS_PREFIX + field: {"$in": query_terms(field, value)}})
+            continue
+        values = [variant for v in filter_values(value) for variant in case_variants(v)]
+        conditions.append({field: {"$in": values}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def filtered_query(query: Callable[[int, Any], List[Dict[str, Any]]], top_k: int, filters: Optional[Filters],
+                   native_filter: Callable[..., Any] = pinecone_filter, terms: bool = False,
+                   overfetch: int = FILTER_OVERFETCH) -> List[Dict[str, Any]]:
+    """
+    Run a query (query(n, native filter) -> results with "id", "score" and
+    "metadata") returning the top results that satisfy payload_matches.
+
+    When the store holds filter terms (terms=True), the filter is pushed down
+    on them and one query returns the exact top_k. Otherwise the whole filter
+    is pushed down first; a store can't match part of a value or a
+    stringified list, so when that finds fewer than top_k, only the exact
+    (keyword) conditions are pushed down over top_k * overfetch candidates and
+    the rest is checked on the results. That costs a second query and can
+    still return fewer than top_k matches.
+    """
+    if not filters:
+        return query(top_k, None)
+    if terms:
+        return query(top_k, native_filter(filters, terms=True))
+    results = [result for result in query(top_k, native_filter(filters))
+               if payload_matches(result["metadata"], filters)]
+    if len(results) >= top_k or all(field in KEYWORD_FILTER_FIELDS for field in filters):
+        return results[:top_k]
+
+    found = {result["id"] for result in results}
+    keyword_filters = {field: value for field, value in filters.items() if field in KEYWORD_FILTER_FIELDS}
+    for result in query(top_k * overfetch, native_filter(keyword_filters)):
+        if result["id"] not in found and payload_matches(result["metadata"], filters):
+            results.append(result)
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return results[:top_k]
+
+
+# ---------------------- Search ------------------------
+class HybridJudgmentSearch:
+    """
+    Semantic judgment search with the query's metadata filters pushed down to
+    the vector database (see filtered_query). When the store holds filter
+    terms (filter_terms=True, e.g. collections written by
+    qdrant_upsert_with_meta_data.py), one query returns the exact top-k
+    matches; otherwise partial values are checked on the results, which may
+    take a second query and return fewer than top-k. Only when nothing at all
+    matches the filters is the query repeated unfiltered. With a BM25 index
+    over the same chunks, dense and sparse rankings are combined by
+    reciprocal rank fusion.
+    """
+
+    def __init__(self, embed: Callable[[str], List[float]], qdrant_client=None, collection_name: str = "",
+                 pinecone_index=None, namespace: str = "", fallback_unfiltered: bool = True,
+                 sparse_index: Optional[BM25Index] = None, filter_terms: bool = False):
+        if (qdrant_client is None) == (pinecone_index is None):
+            raise ValueError("Provide either a Qdrant client or a Pinecone index")
+        self.embed = embed
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.pinecone_index = pinecone_index
+        self.namespace = namespace
+        self.fallback_unfiltered = fallback_unfiltered
+        # When given, dense and BM25 rankings are fused
+        self.sparse_index = sparse_index
+        # The payloads carry filter terms (payload_filter_terms)
+        self.filter_terms = filter_terms
+
+    def _query(self, vector: List[float], top_k: int, filters: Filters) -> List[Dict[str, Any]]:
+        if self.qdrant_client is not None:
+            def query(n, native_filter):
+                points = self.qdrant_client.query_points(
+                    collection_name=self.collection_name,
+                    query=vector,
+                    query_filter=native_filter,
+                    limit=n,
+                    with_payload=True
+                ).points
+                return [{"id": str(point.id), "score": point.score, "metadata": point.payload or {}} for point in points]
+
+            return filtered_query(query, top_k, filters, qdrant_filter, self.filter_terms)
+
+        def query(n, native_filter):
+            results = self.pinecone_index.query(
+                namespace=self.namespace,
+                vector=vector,
+                top_k=n,
+                filter=native_filter,
+                include_metadata=True
+            )
+            return [{"id": match.id, "score": match.score, "metadata": match.metadata or {}} for match in results.matches]
+
+        return filtered_query(query, top_k, filters, pinecone_filter, self.filter_terms)
+
+    def search(self, query: str, top_k: int = 5, filters: Optional[Filters] = None) -> Dict[str, Any]:
+        """
+        Search judgments. Filters default to those extracted from the query.
+        Returns {"filters", "filtered", "matches"}.
+        """
+        if filters is None:
+            filters = extract_metadata_from_query(query)
+        vector = self.embed(query)
+
+        matches = self._search(query, vector, top_k, filters)
+        filtered = bool(filters)
+        if filters and not matches and self.fallback_unfiltered:
+            matches = self._search(query, vector, top_k, {})
+            filtered = False
+        return {"filters": filters, "filtered": filtered, "matches": matches}
+
+    def _search(self, query: str, vector: List[float], top_k: int, filters: Filters) -> List[Dict[str, Any]]:
+        if self.sparse_index is None:
+            return self._query(vector, top_k, filters)
+        fusion = FusionSearch(lambda _, n: self._query(vector, n, filters), self.sparse_index)
+        # Sparse candidates are filtered the way the dense results are (see filtered_query)
+        return fusion.search(query, top_k, lambda payload: payload_matches(payload, filters, self.filter_terms))
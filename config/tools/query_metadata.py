@@ -0,0 +1,251 @@
+import ast
+import os
+import re
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Judgment corpus the tag vocabularies are read from (the collections the upsert scripts index)
+JUDGMENTS_DB_NAME = os.getenv("MONGO_DB_NAME", "legal_documents")
+JUDGMENT_COLLECTIONS = [
+    name.strip() for name in
+    os.getenv("JUDGMENT_COLLECTIONS", "supreme_court_judgments,appeal_court_judgments").split(",")
+    if name.strip()
+]
+# Compile the query extractor from the corpus vocabularies rather than only the defaults
+# (read by the application that registers the vocabulary source, see set_vocabulary_source)
+QUERY_VOCABULARY_FROM_MONGO = os.getenv("QUERY_VOCABULARY_FROM_MONGO", "false").lower() in ("1", "true", "yes")
+
+# Metadata filters extracted from a query: field -> value or list of accepted values
+Filters = Dict[str, Union[str, List[str]]]
+# field -> canonical tag -> phrases naming it in a query
+Vocabulary = Dict[str, Dict[str, List[str]]]
+
+# Payload fields whose distinct values become query vocabulary
+VOCABULARY_FIELDS = [
+    "judges", "case_type", "case_subtype",
+    "process_tags", "behaviour_tags", "outcome_tags", "criminal_tags",
+    "labor_tags", "property_tags", "commercial_tags", "fundamental_right_tags"
+]
+
+# Used until (and in addition to) the corpus vocabulary
+DEFAULT_VOCABULARY: Vocabulary = {
+    "case_type": {"criminal": ["criminal"], "civil": ["civil"]},
+    "case_subtype": {
+        "labor": ["labor", "labour"],
+        "property": ["property"],
+        "commercial": ["commercial"],
+        "fundamental right": ["fundamental right", "fundamental rights"]
+    },
+    "court": {"COURT_OF_APPEAL": ["court of appeal"]},
+    "process_tags": {tag: [tag] for tag in ["certiorari", "mandamus", "habeas corpus", "writ petition", "appeal"]},
+    "behaviour_tags": {tag: [tag] for tag in ["negligence", "misconduct", "arbitrary", "unreasonable"]},
+    "criminal_tags": {tag: [tag] for tag in ["murder", "assault", "rape", "drug", "trafficking"]}
+}
+
+# Honorifics and post-nominals dropped from judge names before matching
+JUDGE_TITLES = {"hon", "honourable", "justice", "judge", "j", "cj", "pc", "jj"}
+# Longest corpus value treated as a tag rather than free text
+MAX_TAG_CHARS = 60
+
+_WORD = re.compile(r"\w+")
+# Judge names, before "was the judge" or after "judge", when not in the vocabulary
+_JUDGE_BEFORE = re.compile(r"([A-Z][a-z]+\s+[A-Z][a-z]+)\s+was\s+the\s+judge")
+_JUDGE_AFTER = re.compile(r"judge\s+([A-Z][a-z]+\s+[A-Z][a-z]+)")
+_CASE_NUMBER = re.compile(r"case\s+number\s+([A-Za-z0-9/\-]+)", re.IGNORECASE)
+
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class TagAutomaton:
+    """
+    Aho-Corasick automaton over words: finds every vocabulary phrase in a query
+    in one left-to-right pass, however many phrases there are. Matching whole
+    words means "appeal" never matches inside "appealed".
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str]]] = [[]]
+
+    def add(self, phrase: str, field: str, tag: str):
+        state = 0
+        for word in words(phrase):
+            if word not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][word] = len(self._goto) - 1
+            state = self._goto[state][word]
+        if state and (field, tag) not in self._out[state]:
+            self._out[state].append((field, tag))
+
+    def build(self):
+        """Compute failure links (breadth first); call once after the last add."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                # A phrase ending here also ends every phrase that is its suffix
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[str, str]]:
+        """(field, tag) for every phrase occurring in the text, in order of occurrence."""
+        found = []
+        state = 0
+        for word in words(text):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            found.extend(self._out[state])
+        return found
+
+
+class QueryMetadataExtractor:
+    """Compiled extractor of structured metadata filters from natural language queries."""
+
+    def __init__(self, vocabulary: Optional[Vocabulary] = None):
+        self.vocabulary = vocabulary if vocabulary is not None else DEFAULT_VOCABULARY
+        self.automaton = TagAutomaton()
+        for field, tags in self.vocabulary.items():
+            for tag, phrases in tags.items():
+                for phrase in phrases:
+                    self.automaton.add(phrase, field, tag)
+        self.automaton.build()
+
+    def extract(self, query: str) -> Filters:
+        """Extract structured metadata filters; a field naming several tags gets a list."""
+        found: Dict[str, List[str]] = {}
+        for field, tag in self.automaton.find(query):
+            tags = found.setdefault(field, [])
+            if tag not in tags:
+                tags.append(tag)
+
+        if "judges" not in found:
+            judge_match = _JUDGE_BEFORE.search(query) or _JUDGE_AFTER.search(query)
+            if judge_match:
+                found["judges"] = [judge_match.group(1).lower()]
+
+        # Case number (if specifically mentioned)
+        case_num_match = _CASE_NUMBER.search(query)
+        if case_num_match:
+            found["case_number"] = [case_num_match.group(1)]
+
+        return {field: tags[0] if len(tags) == 1 else tags for field, tags in found.items()}
+
+
+# ---------------------- Corpus vocabulary ------------------------
+def stored_values(value) -> List[str]:
+    """The tags in one stored field value: a string, a list or a stringified list."""
+    if isinstance(value, str) and value.startswith("["):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    values = value if isinstance(value, list) else [value]
+    return [v.strip() for v in values if isinstance(v, str) and v.strip()]
+
+
+def tag_phrases(field: str, tag: str) -> List[str]:
+    """Phrases a query would use for a stored tag, e.g. "writ_petition" -> "writ petition"."""
+    if len(tag) > MAX_TAG_CHARS:
+        return []
+    tag_words = words(tag.replace("_", " "))
+    if field == "judges":
+        # "Hon. Janak De Silva, J." is named as "Janak De Silva"; a bare surname is too ambiguous
+        tag_words = [word for word in tag_words if word not in JUDGE_TITLES]
+        if len(tag_words) < 2:
+            return []
+    return [" ".join(tag_words)] if tag_words else []
+
+
+def merge_vocabularies(*vocabularies: Vocabulary) -> Vocabulary:
+    merged: Vocabulary = {}
+    for vocabulary in vocabularies:
+        for field, tags in vocabulary.items():
+            for tag, phrases in tags.items():
+                known = merged.setdefault(field, {}).setdefault(tag, [])
+                known.extend(phrase for phrase in phrases if phrase not in known)
+    return merged
+
+
+def load_vocabulary(db, collections: Iterable[str] = JUDGMENT_COLLECTIONS,
+                    fields: Iterable[str] = VOCABULARY_FIELDS) -> Vocabulary:
+    """
+    Read the tag vocabularies from the judgment metadata: the distinct values of
+    each tag field across the collections, merged with DEFAULT_VOCABULARY.
+    """
+    vocabulary: Vocabulary = {}
+    for collection_name in collections:
+        collection = db[collection_name]
+        for field in fields:
+            for value in collection.distinct(field):
+                for tag in stored_values(value):
+                    phrases = tag_phrases(field, tag)
+                    if phrases:
+                        vocabulary.setdefault(field, {}).setdefault(tag, []).extend(phrases)
+    return merge_vocabularies(DEFAULT_VOCABULARY, vocabulary)
+
+
+def build_corpus_extractor(source: Callable[[], Any]) -> Optional[QueryMetadataExtractor]:
+    """
+    Extractor over the judgment collections' vocabulary, read from the database
+    `source()` returns, or None if it can't be read.
+    """
+    try:
+        vocabulary = load_vocabulary(source())
+    except Exception as e:
+        print(f"Warning: could not load query vocabulary from MongoDB: {str(e)}")
+        return None
+    phrases = sum(len(phrases) for tags in vocabulary.values() for phrases in tags.values())
+    print(f"Loaded query vocabulary: {phrases} phrases over {len(vocabulary)} fields")
+    return QueryMetadataExtractor(vocabulary)
+
+
+_extractor: Optional[QueryMetadataExtractor] = None
+_extractor_lock = threading.Lock()
+_vocabulary_source: Optional[Callable[[], Any]] = None
+
+
+def set_vocabulary_source(source: Optional[Callable[[], Any]]):
+    """
+    Register a callable returning the (pymongo) database holding the judgment
+    collections, so the extractor is compiled from the corpus vocabulary. It is
+    only called when the extractor is first used.
+    """
+    global _vocabulary_source, _extractor
+    with _extractor_lock:
+        _vocabulary_source = source
+        _extractor = None
+
+
+def get_query_extractor() -> QueryMetadataExtractor:
+    """
+    The process-wide extractor, compiled once on first use (a filtered
+    search): from the corpus vocabulary when a vocabulary source is
+    registered, falling back to DEFAULT_VOCABULARY.
+    """
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                extractor = build_corpus_extractor(_vocabulary_source) if _vocabulary_source else None
+                _extractor = extractor or QueryMetadataExtractor()
+    return _extractor
+
+
+def set_query_extractor(extractor: QueryMetadataExtractor):
+    global _extractor
+    _extractor = extractor
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+from config.tools.embedding_batches import call_with_backoff
+from config.tools.embedding_cache import normalize_text
+
+# Load environment variables
+load_dotenv()
+
+# Rerank the court-judgment search tools' results
+RERANK_SEARCH_RESULTS = os.getenv("RERANK_SEARCH_RESULTS", "false").lower() in ("1", "true", "yes")
+# Chat model that scores all candidates of a query in one request
+RERANK_MODEL = os.getenv("RERANK_MODEL", "gpt-4o-mini")
+# When set (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2), candidates are scored locally
+# on CPU with sentence-transformers instead of the chat model
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "")
+# (query, passage) scores kept per process
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+# Characters of each passage shown to the scorer
+RERANK_PASSAGE_CHARS = int(os.getenv("RERANK_PASSAGE_CHARS", "1200"))
+
+
+def passage_id(result: Dict[str, Any]) -> str:
+    """Stable id of a search result: its vector id, else a hash of its text."""
+    if result.get("id"):
+        return str(result["id"])
+    text = result.get("text") or (result.get("metadata") or {}).get("text", "")
+    return "chunk_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class ScoreCache:
+    """In-memory LRU of relevance scores keyed by scorer, normalized query and passage id."""
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(scorer: str, query: str, id_: str) -> str:
+        return hashlib.sha256(f"{scorer}\0{normalize_text(query)}\0{id_}".encode("utf-8")).hexdigest()
+
+    def get_many(self, scorer: str, query: str, ids: List[str]) -> Dict[str, float]:
+        found = {}
+        with self._lock:
+            for id_ in ids:
+                key = self.key(scorer, query, id_)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[id_] = self._entries[key]
+        self.hits += len(found)
+        self.misses += len(set(ids)) - len(found)
+        return found
+
+    def put_many(self, scorer: str, query: str, scores: Dict[str, float]):
+        with self._lock:
+            for id_, score in scores.items():
+                key = self.key(scorer, query, id_)
+                self._entries[key] = score
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+# ---------------------- Scorers ------------------------
+class LLMScorer:
+    """Scores every passage of a query with a single structured chat completion."""
+
+    def __init__(self, model: str = RERANK_MODEL, client=None, passage_chars: int = RERANK_PASSAGE_CHARS):
+        self.model = model
+        self.name = f"llm:{model}"
+        self.passage_chars = passage_chars
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        """Relevance of each passage to the query, 0 (irrelevant) to 10 (most relevant)."""
+        numbered = "\n\n".join(
+            f"[{i}] {passage[:self.passage_chars]}" for i, passage in enumerate(passages)
+        )
+        prompt = (
+            f'Rate the relevance of each numbered text to the query: "{query}"\n'
+            "Assign each a score from 0 to 10, where 10 is most relevant.\n"
+            f'Return JSON of the form {{"scores": [...]}} with exactly {len(passages)} numbers, in order.\n\n'
+            f"{numbered}"
+        )
+        response = call_with_backoff(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0,
+            max_tokens=16 + 6 * len(passages)
+        )
+        try:
+            scores = json.loads(response.choices[0].message.content)["scores"]
+            scores = [float(score) for score in scores]
+        except (ValueError, KeyError, TypeError):
+            scores = []
+        # Passages the model skipped rank last
+        return (scores + [0.0] * len(passages))[:len(passages)]
+
+
+class CrossEncoderScorer:
+    """Scores (query, passage) pairs with a local sentence-transformers cross-encoder."""
+
+    def __init__(self, model: str = CROSS_ENCODER_MODEL, passage_chars: int = RERANK_PASSAGE_CHARS):
+        from sentence_transformers import CrossEncoder
+
+        self.name = f"cross-encoder:{model}"
+        self.passage_chars = passage_chars
+        self.model = CrossEncoder(model, device="cpu")
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        pairs = [(query, passage[:self.passage_chars]) for passage in passages]
+        return [float(score) for score in self.model.predict(pairs)]
+
+
+# ---------------------- Reranker ------------------------
+class Reranker:
+    """
+    Reorders search results by relevance to the query. All uncached candidates
+    of a query are scored in one scorer call, and scores are cached by
+    (query, passage id), so repeated queries cost nothing.
+    """
+
+    def __init__(self, scorer=None, cache: Optional[ScoreCache] = None):
+        self.scorer = scorer or (CrossEncoderScorer() if CROSS_ENCODER_MODEL else LLMScorer())
+        self.cache = cache or ScoreCache()
+
+    def scores(self, query: str, results: List[Dict[str, Any]]) -> List[float]:
+        ids = [passage_id(result) for result in results]
+        found = self.cache.get_many(self.scorer.name, query, ids)
+
+        missing = {}
+        for id_, result in zip(ids, results):
+            if id_ not in found and id_ not in missing:
+                missing[id_] = result.get("text") or (result.get("metadata") or {}).get("text", "")
+        if missing:
+            computed = dict(zip(missing, self.scorer.score(query, list(missing.values()))))
+            self.cache.put_many(self.scorer.name, query, computed)
+            found.update(computed)
+        return [found[id_] for id_ in ids]
+
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Results (dicts with "text" or metadata["text"]) best first, each with
+        its "rerank_score"; the retrieval order breaks ties.
+        """
+        if not results:
+            return []
+        scored = []
+        for result, score in zip(results, self.scores(query, results)):
+            scored.append({**result, "rerank_score": score})
+        scored.sort(key=lambda result: result["rerank_score"], reverse=True)
+        return scored[:top_k] if top_k is not None else scored
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> Reranker:
+    """The reranker (and score cache) shared by every search tool in this process."""
+    return Reranker()
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+from typing import List, Dict, Any, Optional, Union
+from dotenv import load_dotenv
+
+from config.tools.embedding_batches import estimate_tokens
+
+# Load environment variables
+load_dotenv()
+
+# Estimated tokens of search results returned to an agent per tool call
+SEARCH_RESULT_MAX_TOKENS = int(os.getenv("SEARCH_RESULT_MAX_TOKENS", "1500"))
+# Characters of each passage kept around its best-matching span (0 keeps whole passages)
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "800"))
+# Comma-separated metadata fields included with each result (empty includes all of them)
+SEARCH_RESULT_FIELDS = [field.strip() for field in os.getenv("SEARCH_RESULT_FIELDS", "").split(",") if field.strip()]
+
+_WORD = re.compile(r"\w{3,}")
+STOPWORDS = {"the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "which", "under", "into"}
+
+
+def query_terms(queries: List[str]) -> List[str]:
+    """Distinct lowercase words of the queries worth matching against passages."""
+    terms = []
+    for query in queries:
+        for word in _WORD.findall(query.lower()):
+            if word not in STOPWORDS and word not in terms:
+                terms.append(word)
+    return terms
+
+
+class ResultFormatter:
+    """
+    Turns search results into compact JSON for an agent's context: each passage
+    once (never repeated inside its metadata), cut to a snippet around the part
+    that best matches the query, only whitelisted metadata fields, and no more
+    results than fit the token budget.
+    """
+
+    def __init__(self, max_tokens: int = SEARCH_RESULT_MAX_TOKENS, snippet_chars: int = SEARCH_SNIPPET_CHARS,
+                 fields: Optional[List[str]] = None):
+        self.max_tokens = max_tokens
+        self.snippet_chars = snippet_chars
+        self.fields = fields if fields is not None else SEARCH_RESULT_FIELDS
+
+    def snippet(self, text: str, terms: List[str]) -> str:
+        """The snippet_chars window of text containing the most query term occurrences."""
+        if not self.snippet_chars or len(text) <= self.snippet_chars:
+            return text
+
+        lowered = text.lower()
+        positions = sorted(
+            match.start()
+            for term in terms
+            for match in re.finditer(re.escape(term), lowered)
+        )
+        start = 0
+        if positions:
+            # Slide the window over the occurrences and keep the densest one
+            best = 0
+            end = 0
+            for i, position in enumerate(positions):
+                while end < len(positions) and positions[end] < position + self.snippet_chars:
+                    end += 1
+                if end - i > best:
+                    best, start = end - i, position
+            # Open with a little context before the first matched term
+            start = max(0, min(start - self.snippet_chars // 10, len(text) - self.snippet_chars))
+            while start > 0 and not text[start - 1].isspace():
+                start -= 1
+
+        snippet = text[start:start + self.snippet_chars].strip()
+        return ("..." if start > 0 else "") + snippet + ("..." if start + self.snippet_chars < len(text) else "")
+
+    def compact(self, result: Dict[str, Any], terms: List[str]) -> Dict[str, Any]:
+        metadata = result.get("metadata") or {}
+        item = {
+            "text": self.snippet(result.get("text") or metadata.get("text", ""), terms),
+            "score": round(float(result.get("score", 0.0)), 4)
+        }
+        for name, value in metadata.items():
+            if name != "text" and (not self.fields or name in self.fields):
+                item[name] = value
+        if "rerank_score" in result:
+            item["rerank_score"] = round(float(result["rerank_score"]), 4)
+        for name in ("namespace", "queries"):
+            if name in result:
+                item[name] = result[name]
+        return item
+
+    def format(self, results: Union[List[Dict[str, Any]], Dict[str, Any]], query: Union[str, List[str]]) -> str:
+        """
+        Serialize results (a list, or the {"queries", "results"} dict of a batch
+        search) within the token budget. Results are expected best first.
+        """
+        batch = isinstance(results, dict)
+        items = results["results"] if batch else results
+        # Batch results refer to queries by their index in the (deduplicated) batch
+        queries = results["queries"] if batch else ([query] if isinstance(query, str) else list(query))
+
+        compacted = []
+        used = 0
+        for result in items:
+            # In a batch, snippets are centred on the queries that found each passage
+            terms = query_terms([queries[i] for i in result["queries"]] if "queries" in result else queries)
+            item = self.compact(result, terms)
+            tokens = estimate_tokens(json.dumps(item, ensure_ascii=False))
+            if compacted and used + tokens > self.max_tokens:
+                break
+            compacted.append(item)
+            used += tokens
+
+        output: Dict[str, Any] = {}
+        if batch:
+            output["queries"] = results["queries"]
+        output["results"] = compacted
+        if len(compacted) < len(items):
+            # Lower-ranked results left out to stay within the budget
+            output["omitted"] = len(items) - len(compacted)
+        return json.dumps(output, ensure_ascii=False, separators=(",", ":"))
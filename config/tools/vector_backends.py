@@ -0,0 +1,304 @@
+# In-process vector store backends for the search tools. A local store is built
+# once from a Qdrant collection or Pinecone namespace export:
+#
+#   python -m config.tools.vector_backends qdrant legal-docs vector_store
+#   python -m config.tools.vector_backends pinecone judgments-index vector_store --namespace appeal_court
+#
+# --sparse-index also writes the BM25 index of the chunks (SPARSE_INDEX_DIR/<collection or
+# namespace>.json.gz); without an output directory only the BM25 index is built.
+import argparse
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from config.tools.hybrid_search import normalized_values
+from config.tools.sparse_index import BM25Index, sparse_index_path
+
+# Load environment variables
+load_dotenv()
+
+# Directory of a local vector store; when set, main_exec searches it instead of Pinecone/Qdrant
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "")
+
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.jsonl"
+MANIFEST_FILE = "manifest.json"
+# Metadata fields not indexed for filtering (the chunk text itself)
+UNFILTERED_FIELDS = {"text"}
+
+
+@dataclass
+class Match:
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class QueryResponse:
+    matches: List[Match]
+
+
+@dataclass
+class FetchResponse:
+    vectors: Dict[str, Dict[str, Any]]
+
+
+class VectorBackend(ABC):
+    """The subset of the Pinecone Index API the search tools rely on."""
+
+    @abstractmethod
+    def query(self, vector: List[float], top_k: int, namespace: str = "", include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> QueryResponse:
+        ...
+
+    @abstractmethod
+    def fetch(self, ids: List[str], namespace: str = "") -> FetchResponse:
+        ...
+
+    @abstractmethod
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = ""):
+        ...
+
+
+class LocalNamespace:
+    """
+    One namespace of a local store: an (n, dim) float32 memmap of unit vectors
+    and their ids/metadata, plus the rows holding each metadata value, so
+    filters are evaluated with array operations rather than row by row.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.count = manifest["count"]
+        self.dim = manifest["dim"]
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.metadata.append(record["metadata"])
+        self.positions = {id_: i for i, id_ in enumerate(self.ids)}
+        self.value_rows = self._index_values()
+        self.vectors = np.memmap(
+            os.path.join(directory, VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+        ) if self.count else np.zeros((0, self.dim), dtype=np.float32)
+
+    def _index_values(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """field -> lowercased value -> rows holding it (lists and stringified lists hold each item)."""
+        rows: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for i, metadata in enumerate(self.metadata):
+            for name, value in metadata.items():
+                if name not in UNFILTERED_FIELDS:
+                    for item in normalized_values(value):
+                        rows[name][item].append(i)
+        return {
+            name: {item: np.asarray(positions, dtype=np.int64) for item, positions in values.items()}
+            for name, values in rows.items()
+        }
+
+    def filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Rows passing a Pinecone-style filter ($and, $in, $eq), compared case-insensitively."""
+        if "$and" in filter:
+            mask = np.ones(self.count, dtype=bool)
+            for condition in filter["$and"]:
+                mask &= self.filter_mask(condition)
+            return mask
+        mask = np.ones(self.count, dtype=bool)
+        for name, condition in filter.items():
+            accepted = condition["$in"] if "$in" in condition else [condition.get("$eq")]
+            values = self.value_rows.get(name, {})
+            field_mask = np.zeros(self.count, dtype=bool)
+            for value in {str(value).lower() for value in accepted}:
+                if value in values:
+                    field_mask[values[value]] = True
+            mask &= field_mask
+        return mask
+
+    def search(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        # Stored vectors are unit length, so the dot product is the cosine similarity
+        scores = self.vectors @ query
+        k = min(top_k, self.count)
+        if filter:
+            # Rank only the vectors whose metadata passes the filter
+            allowed = self.filter_mask(filter)
+            scores = np.where(allowed, scores, -np.inf)
+            k = min(k, int(allowed.sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+class LocalVectorBackend(VectorBackend):
+    """
+    Read-only, in-process vector store: one sub-directory per namespace, each
+    holding the vector matrix, its metadata sidecar and a manifest. Namespaces
+    are opened lazily and memory-mapped, so only the pages touched are read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._namespaces: Dict[str, LocalNamespace] = {}
+
+    def namespace(self, name: str) -> LocalNamespace:
+        if name not in self._namespaces:
+            directory = os.path.join(self.path, name or "default")
+            if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+                raise FileNotFoundError(f"No local vector namespace '{name}' in {self.path}")
+            self._namespaces[name] = LocalNamespace(directory)
+        return self._namespaces[name]
+
+    def query(self, vector: List[float], top_k: int, namespace: str = "", include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> QueryResponse:
+        store = self.namespace(namespace)
+        return QueryResponse(matches=[
+            Match(id=store.ids[i], score=score, metadata=store.metadata[i] if include_metadata else {})
+            for i, score in store.search(vector, top_k, filter)
+        ])
+
+    def fetch(self, ids: List[str], namespace: str = "") -> FetchResponse:
+        store = self.namespace(namespace)
+        return FetchResponse(vectors={
+            id_: {"id": id_, "values": store.vectors[store.positions[id_]].tolist(), "metadata": store.metadata[store.positions[id_]]}
+            for id_ in ids if id_ in store.positions
+        })
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = ""):
+        raise NotImplementedError("Local vector stores are read-only; rebuild them from an export")
+
+
+class LocalNamespaceWriter:
+    """Streams (id, vector, metadata) records into a new local namespace."""
+
+    def __init__(self, path: str, namespace: str):
+        self.directory = os.path.join(path, namespace or "default")
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors = open(os.path.join(self.directory, VECTORS_FILE), "wb")
+        self._metadata = open(os.path.join(self.directory, METADATA_FILE), "w", encoding="utf-8")
+        self.count = 0
+        self.dim: Optional[int] = None
+
+    def add(self, id_: str, vector: List[float], metadata: Optional[Dict[str, Any]] = None):
+        values = np.asarray(vector, dtype=np.float32)
+        if self.dim is None:
+            self.dim = len(values)
+        elif len(values) != self.dim:
+            raise ValueError(f"Vector {id_} has {len(values)} dimensions, expected {self.dim}")
+        norm = np.linalg.norm(values)
+        if norm:
+            values = values / norm
+        self._vectors.write(values.tobytes())
+        self._metadata.write(json.dumps({"id": str(id_), "metadata": metadata or {}}, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._vectors.close()
+        self._metadata.close()
+        with open(os.path.join(self.directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"count": self.count, "dim": self.dim or 0}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_qdrant_collection(client, collection_name: str, writer: Optional[LocalNamespaceWriter] = None,
+                             batch_size: int = 256, sparse_index: Optional[BM25Index] = None) -> int:
+    """
+    Copy every point (vector + payload) of a Qdrant collection into a local
+    namespace and/or index its chunk texts in a BM25 index.
+    """
+    offset = None
+    count = 0
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=writer is not None
+        )
+        for point in points:
+            export_point(str(point.id), point.vector, point.payload, writer, sparse_index)
+            count += 1
+        if offset is None:
+            return count
+
+
+def export_pinecone_namespace(index, namespace: str, writer: Optional[LocalNamespaceWriter] = None,
+                              sparse_index: Optional[BM25Index] = None) -> int:
+    """
+    Copy every vector of a Pinecone (serverless) index namespace into a local
+    namespace and/or index its chunk texts in a BM25 index.
+    """
+    count = 0
+    for ids in index.list(namespace=namespace):
+        fetched = index.fetch(ids=list(ids), namespace=namespace).vectors
+        for id_ in ids:
+            vector = fetched[id_]
+            export_point(id_, vector.values, vector.metadata, writer, sparse_index)
+            count += 1
+    return count
+
+
+def export_point(id_: str, vector: List[float], metadata: Optional[Dict[str, Any]],
+                 writer: Optional[LocalNamespaceWriter], sparse_index: Optional[BM25Index]):
+    if writer is not None:
+        writer.add(id_, vector, metadata)
+    if sparse_index is not None and (metadata or {}).get("text"):
+        sparse_index.add(id_, metadata["text"], metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a local vector store from a Qdrant or Pinecone export")
+    parser.add_argument("source", choices=["qdrant", "pinecone"])
+    parser.add_argument("name", help="Qdrant collection or Pinecone index name")
+    parser.add_argument("output", nargs="?", help="Local vector store directory")
+    parser.add_argument("--namespace", default="", help="Pinecone namespace (also the local namespace name)")
+    parser.add_argument("--sparse-index", action="store_true", help="Also build the BM25 index of the chunk texts")
+    args = parser.parse_args()
+    if not args.output and not args.sparse_index:
+        parser.error("give an output directory and/or --sparse-index")
+
+    # The local namespace and BM25 index are named after the collection or Pinecone namespace
+    name = args.name if args.source == "qdrant" else args.namespace
+    writer = LocalNamespaceWriter(args.output, name) if args.output else None
+    sparse_index = BM25Index() if args.sparse_index else None
+    try:
+        if args.source == "qdrant":
+            from qdrant_client import QdrantClient
+            client = QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+            count = export_qdrant_collection(client, args.name, writer, sparse_index=sparse_index)
+        else:
+            from pinecone import Pinecone
+            index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(args.name)
+            count = export_pinecone_namespace(index, args.namespace, writer, sparse_index)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        print(f"Exported {count} vectors to {args.output}")
+    if sparse_index is not None:
+        path = sparse_index_path(name)
+        sparse_index.save(path)
+        print(f"Indexed {len(sparse_index)} chunks in {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import hashlib
+import os
+import uuid
+from typing import Tuple
+
+import aiofiles
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Content-addressed PDF storage (<dir>/<sha256[:2]>/<sha256>.pdf); point every
+# API node and worker at the same shared volume for multi-node deployments
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", "document_store")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"Upload exceeds the {max_bytes} byte limit")
+
+
+def document_path(content_hash: str) -> str:
+    """Storage path of the document with the given SHA-256 hex digest."""
+    return os.path.join(DOCUMENT_STORE_DIR, content_hash[:2], f"{content_hash}.pdf")
+
+
+async def save_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, str, int]:
+    """
+    Stream an uploaded file to content-addressed storage in chunks, hashing it
+    on the way. Identical files are stored once. Returns (content_hash, path, size).
+    """
+    os.makedirs(DOCUMENT_STORE_DIR, exist_ok=True)
+    tmp_path = os.path.join(DOCUMENT_STORE_DIR, f".upload-{uuid.uuid4().hex}.tmp")
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                sha256.update(chunk)
+                await f.write(chunk)
+
+        content_hash = sha256.hexdigest()
+        path = document_path(content_hash)
+        if os.path.exists(path):
+            # Already stored: the new copy is a duplicate
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return content_hash, path, size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,482 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from dotenv import load_dotenv
+
+from chunking import TokenChunker, get_chunker
+from config.tools.sparse_index import BM25Index, sparse_index_path
+from config.tools.embedding_batches import (
+    AdaptiveLimiter, call_with_backoff, is_rate_limit_error, token_budget_batches, MAX_BATCH_TOKENS, MAX_BATCH_ITEMS
+)
+
+T = TypeVar("T")
+
+# Load environment variables
+load_dotenv()
+
+# Embedding model of the Qdrant judgment and law collections
+INGEST_EMBEDDING_MODEL = os.getenv("INGEST_EMBEDDING_MODEL", "text-embedding-3-small")
+# Embedding requests in flight at once during ingestion
+INGEST_EMBEDDING_CONCURRENCY = int(os.getenv("INGEST_EMBEDDING_CONCURRENCY", "4"))
+# Estimated tokens per embedding request
+INGEST_MAX_BATCH_TOKENS = int(os.getenv("INGEST_MAX_BATCH_TOKENS", str(MAX_BATCH_TOKENS)))
+# PDF extraction processes (pdfplumber is CPU bound)
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS") or max(1, (os.cpu_count() or 2) - 1))
+# Upsert requests in flight at once
+INGEST_UPSERT_CONCURRENCY = int(os.getenv("INGEST_UPSERT_CONCURRENCY", "2"))
+# Items held between two pipeline stages before the earlier stage waits
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+# Namespace of the deterministic chunk point ids
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a4e-3b7d-5e8f-9a0b-1c2d3e4f5a6b")
+
+
+# ---------------------- Embedding ------------------------
+class ChunkEmbedder:
+    """
+    Embeds a stream of chunks from any number of documents: chunks are grouped
+    into token-budgeted batches (one request each, regardless of which document
+    they came from), a bounded number of batches run concurrently, and
+    rate-limit errors slow all workers down together.
+    """
+
+    def __init__(self, client, model: str = INGEST_EMBEDDING_MODEL,
+                 concurrency: int = INGEST_EMBEDDING_CONCURRENCY,
+                 max_batch_tokens: int = INGEST_MAX_BATCH_TOKENS, max_batch_items: int = MAX_BATCH_ITEMS):
+        self.client = client
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.limiter = AdaptiveLimiter()
+        self.requests = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """One embeddings request for the texts (retried on rate limits)."""
+        start = time.perf_counter()
+        response = call_with_backoff(
+            self.client.embeddings.create,
+            input=texts,
+            model=self.model,
+            limiter=self.limiter
+        )
+        with self._lock:
+            self.requests += 1
+            self.busy_seconds += time.perf_counter() - start
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, items: Iterable[T], text_of: Callable[[T], str] = lambda item: item) -> Iterator[Tuple[T, List[float]]]:
+        """
+        Yield (item, embedding) pairs, a batch at a time as batches complete (not
+        necessarily in input order). Items are read lazily; at most `concurrency`
+        batches are held in memory.
+        """
+        def embed_batch(batch: List[T]) -> List[Tuple[T, List[float]]]:
+            try:
+                return list(zip(batch, self.embed_texts([text_of(item) for item in batch])))
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    raise
+                if len(batch) == 1:
+                    # A chunk the API rejects is skipped, not the whole run
+                    print(f"Error embedding chunk: {str(e)}")
+                    with self._lock:
+                        self.failed += 1
+                    return []
+                print(f"Embedding a batch of {len(batch)} chunks failed ({str(e)}); retrying them one by one")
+                return [pair for item in batch for pair in embed_batch([item])]
+
+        batches = token_budget_batches(items, text_of, self.max_batch_tokens, self.max_batch_items)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for batch in batches:
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                pending.add(executor.submit(embed_batch, batch))
+            for future in pending:
+                yield from future.result()
+
+
+# ---------------------- Incremental ingestion ------------------------
+def point_id(source: str, chunk_index: int, model: str = INGEST_EMBEDDING_MODEL) -> str:
+    """
+    Deterministic Qdrant point id of a chunk: re-ingesting the same document
+    overwrites its points instead of adding copies.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}\0{chunk_index}\0{model}"))
+
+
+def document_fingerprint(content_hash: str, model: str = INGEST_EMBEDDING_MODEL,
+                         metadata: Optional[Dict[str, Any]] = None, chunking: Optional[str] = None) -> str:
+    """Changes whenever the file, the embedding model, the chunking or the payload metadata does."""
+    chunking = chunking or get_chunker().signature
+    key = json.dumps([content_hash, model, chunking, metadata or {}], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def scroll_points(qdrant, collection: str, payload_filter=None, with_payload=True,
+                  page_size: int = 256) -> Iterator[Any]:
+    """Every point of a Qdrant collection (matching the filter), without vectors."""
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=collection,
+            scroll_filter=payload_filter,
+            limit=page_size,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=False
+        )
+        yield from points
+        if offset is None:
+            return
+
+
+class QdrantFingerprintStore:
+    """
+    Record of the documents ingested into a collection, kept in the
+    collection itself: a document's fingerprint and chunk count are set on the
+    payload of its first chunk once all of its chunks are upserted, so the
+    record survives runs on a fresh checkout (the scheduled CI job). Each
+    collection's fingerprints are read with one scroll over its first chunks.
+    """
+
+    def __init__(self, qdrant, model: str = INGEST_EMBEDDING_MODEL):
+        self.qdrant = qdrant
+        self.model = model
+        self._known: Dict[str, Dict[str, Tuple[str, int]]] = {}
+
+    def _load(self, collection: str) -> Dict[str, Tuple[str, int]]:
+        if collection not in self._known:
+            from qdrant_client.models import FieldCondition, Filter, MatchValue
+
+            known = {}
+            if self.qdrant.collection_exists(collection):
+                first_chunks = Filter(must=[FieldCondition(key="chunk_index", match=MatchValue(value=0))])
+                for point in scroll_points(self.qdrant, collection, first_chunks,
+                                           with_payload=["source", "fingerprint", "chunks"]):
+                    payload = point.payload or {}
+                    if payload.get("fingerprint") and payload.get("source"):
+                        known[payload["source"]] = (payload["fingerprint"], int(payload.get("chunks", 0)))
+            print(f"Read the fingerprints of {len(known)} documents from {collection}")
+            self._known[collection] = known
+        return self._known[collection]
+
+    def get(self, collection: str, source: str) -> Optional[Tuple[str, int]]:
+        """(fingerprint, chunks) of the document as last ingested, or None."""
+        return self._load(collection).get(source)
+
+    def put(self, collection: str, source: str, fingerprint: str, chunks: int):
+        self.qdrant.set_payload(
+            collection_name=collection,
+            payload={"fingerprint": fingerprint, "chunks": chunks},
+            points=[point_id(source, 0, self.model)]
+        )
+        self._load(collection)[source] = (fingerprint, chunks)
+
+    def clear(self, collection: str):
+        """Forget a collection's documents (when the collection is recreated)."""
+        self._known[collection] = {}
+
+
+def sparse_index_for_collection(qdrant, collection: str) -> BM25Index:
+    """
+    The collection's saved BM25 index; when there is no saved index (e.g. on a
+    fresh checkout), it is rebuilt from the chunk texts stored in the
+    collection rather than covering only the documents ingested in this run.
+    """
+    path = sparse_index_path(collection)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    sparse_index = BM25Index()
+    if qdrant.collection_exists(collection):
+        for point in scroll_points(qdrant, collection):
+            payload = point.payload or {}
+            if payload.get("text"):
+                sparse_index.add(point.id, payload["text"], payload)
+        print(f"Rebuilt the BM25 index of {collection} from {len(sparse_index)} stored chunks")
+    return sparse_index
+
+
+class IngestionTracker:
+    """
+    Decides which documents of a run need embedding and records each one's
+    fingerprint only once all of its chunks are upserted, so a document
+    interrupted or partly failed is picked up again by the next run.
+    """
+
+    def __init__(self, store: QdrantFingerprintStore, collection: str, model: str = INGEST_EMBEDDING_MODEL):
+        self.store = store
+        self.collection = collection
+        self.model = model
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def unchanged(self, source: str, fingerprint: str) -> bool:
+        known = self.store.get(self.collection, source)
+        return known is not None and known[0] == fingerprint
+
+    def begin(self, source: str, fingerprint: str, chunks: int) -> List[str]:
+        """
+        Register a document about to be (re-)ingested. Returns the ids of points
+        from its previous version beyond its new chunk count, to delete.
+        """
+        known = self.store.get(self.collection, source)
+        self._pending[source] = {"fingerprint": fingerprint, "chunks": chunks, "upserted": 0}
+        previous_chunks = known[1] if known else 0
+        return [point_id(source, i, self.model) for i in range(chunks, previous_chunks)]
+
+    def upserted(self, payloads: Iterable[Dict[str, Any]]) -> int:
+        """Count upserted chunks (payloads with a "source"); returns the documents completed."""
+        completed = 0
+        for payload in payloads:
+            pending = self._pending.get(payload["source"])
+            if pending is None:
+                continue
+            pending["upserted"] += 1
+            if pending["upserted"] == pending["chunks"]:
+                self.store.put(self.collection, payload["source"], pending["fingerprint"], pending["chunks"])
+                del self._pending[payload["source"]]
+                completed += 1
+        return completed
+
+
+# ---------------------- Pipeline ------------------------
+def extract_pdf_pages(pdf_path: str) -> List[str]:
+    """Text of each page of a PDF (pages without text are left out)."""
+    import pdfplumber
+
+    text = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text.append(page_text.strip())
+    return text
+
+
+def extract_pdf_chunks(pdf_path: str, chunker: Optional[TokenChunker] = None) -> List[str]:
+    """Token-bounded chunks of a PDF's text (chunks may span pages)."""
+    return (chunker or get_chunker()).chunk_pages(extract_pdf_pages(pdf_path))
+
+
+def _extract_job(job: Dict[str, Any]) -> Tuple[List[str], float]:
+    # Runs in an extraction process; jobs carry the PDF path. Chunking is
+    # CPU bound too, so it happens here rather than in the embedding stage
+    start = time.perf_counter()
+    return extract_pdf_chunks(job["pdf_path"]), time.perf_counter() - start
+
+
+class StageMetrics:
+    """Items handled and time spent working by one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "items_per_second": round(self.items / wall_seconds, 2) if wall_seconds else None
+        }
+
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    """
+    Extract -> embed -> upsert with the stages overlapped: a process pool parses
+    PDFs, one thread streams their chunks through the ChunkEmbedder (itself
+    running several requests at once), and a few threads upsert the points.
+    Stages are joined by bounded queues, so a slow stage holds the earlier ones
+    back instead of letting work pile up in memory.
+
+    Hooks (all but upsert run one at a time):
+        documents(job, chunks) -> payloads to embed for an extracted document
+            (each with a "text"); an empty list skips the document
+        to_point(payload, vector) -> the point to upsert
+        upsert(points) -> write a batch of points (runs concurrently)
+        after_upsert(points) -> bookkeeping once a batch is written
+    """
+
+    def __init__(self, embedder: ChunkEmbedder,
+                 documents: Callable[[Dict[str, Any], List[str]], List[Dict[str, Any]]],
+                 to_point: Callable[[Dict[str, Any], List[float]], Any],
+                 upsert: Callable[[List[Any]], None],
+                 after_upsert: Optional[Callable[[List[Any]], None]] = None,
+                 extract_workers: int = INGEST_EXTRACT_WORKERS,
+                 upsert_workers: int = INGEST_UPSERT_CONCURRENCY,
+                 queue_size: int = INGEST_QUEUE_SIZE,
+                 upsert_batch_size: int = 100):
+        self.embedder = embedder
+        self.documents = documents
+        self.to_point = to_point
+        self.upsert = upsert
+        self.after_upsert = after_upsert
+        self.extract_workers = max(1, extract_workers)
+        self.upsert_workers = max(1, upsert_workers)
+        self.queue_size = max(1, queue_size)
+        self.upsert_batch_size = upsert_batch_size
+        self.metrics = {name: StageMetrics(name) for name in ("extract", "embed", "upsert")}
+        self.failures = {"extract": 0, "upsert": 0}
+
+    def run(self, jobs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Ingest the jobs (dicts with at least "pdf_path"). Returns per-stage
+        metrics; failed documents and batches are counted, not raised. An
+        exception from a hook stops every stage and is raised once they have
+        wound down.
+        """
+        extracted: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        embedded: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        errors: List[Exception] = []
+        stop = threading.Event()
+        extraction_finished = threading.Event()
+        after_upsert_lock = threading.Lock()
+        start = time.perf_counter()
+
+        def put(stage: "queue.Queue", item) -> bool:
+            # Blocks while the next stage is behind; gives up once the run is stopping
+            while not stop.is_set():
+                try:
+                    stage.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fail(e: Exception):
+            errors.append(e)
+            stop.set()
+
+        def produce():
+            try:
+                with ProcessPoolExecutor(max_workers=self.extract_workers) as pool:
+                    pending = {}
+
+                    def hand_over(done):
+                        for future in done:
+                            job = pending.pop(future)
+                            try:
+                                chunks, seconds = future.result()
+                            except Exception as e:
+                                print(f"Error processing {job.get('source', job['pdf_path'])}: {str(e)}")
+                                self.failures["extract"] += 1
+                                continue
+                            self.metrics["extract"].record(1, seconds)
+                            if not put(extracted, (job, chunks)):
+                                return
+
+                    for job in jobs:
+                        if stop.is_set():
+                            break
+                        # Keep every extraction process busy, but no more queued than that
+                        if len(pending) >= self.extract_workers * 2:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            hand_over(done)
+                        pending[pool.submit(_extract_job, job)] = job
+                    while pending and not stop.is_set():
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        hand_over(done)
+                    if stop.is_set():
+                        pool.shutdown(cancel_futures=True)
+            except Exception as e:
+                fail(e)
+            finally:
+                # The embedding stage reads (or, when stopping, drains) until it sees this
+                extracted.put(_DONE)
+
+        def payloads():
+            while not stop.is_set():
+                item = extracted.get()
+                if item is _DONE:
+                    extraction_finished.set()
+                    return
+                job, chunks = item
+                yield from self.documents(job, chunks)
+
+        def embed():
+            embedded_chunks = 0
+            busy = self.embedder.busy_seconds
+            try:
+                batch = []
+                for payload, vector in self.embedder.embed(payloads(), text_of=lambda payload: payload["text"]):
+                    embedded_chunks += 1
+                    batch.append(self.to_point(payload, vector))
+                    if len(batch) >= self.upsert_batch_size:
+                        if not put(embedded, batch):
+                            break
+                        batch = []
+                if batch:
+                    put(embedded, batch)
+            except Exception as e:
+                fail(e)
+            finally:
+                self.metrics["embed"].record(embedded_chunks, self.embedder.busy_seconds - busy)
+                if not extraction_finished.is_set():
+                    # Stopping: unblock the extraction stage without running the
+                    # documents hook on what it already extracted
+                    while extracted.get() is not _DONE:
+                        pass
+                for _ in range(self.upsert_workers):
+                    embedded.put(_DONE)
+
+        def consume():
+            while True:
+                batch = embedded.get()
+                if batch is _DONE:
+                    return
+                if stop.is_set():
+                    continue
+                batch_start = time.perf_counter()
+                try:
+                    self.upsert(batch)
+                except Exception as e:
+                    print(f"Error upserting {len(batch)} points: {str(e)}")
+                    self.failures["upsert"] += 1
+                    continue
+                self.metrics["upsert"].record(len(batch), time.perf_counter() - batch_start)
+                if self.after_upsert is not None:
+                    try:
+                        with after_upsert_lock:
+                            self.after_upsert(batch)
+                    except Exception as e:
+                        fail(e)
+
+        threads = [threading.Thread(target=produce, name="ingest-extract"),
+                   threading.Thread(target=embed, name="ingest-embed")]
+        threads += [threading.Thread(target=consume, name=f"ingest-upsert-{i}") for i in range(self.upsert_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        wall_seconds = time.perf_counter() - start
+        report = {name: metrics.summary(wall_seconds) for name, metrics in self.metrics.items()}
+        report["embed"]["requests"] = self.embedder.requests
+        report["embed"]["chunks_failed"] = self.embedder.failed
+        report["extract"]["failed"] = self.failures["extract"]
+        report["upsert"]["failed_batches"] = self.failures["upsert"]
+        report["wall_seconds"] = round(wall_seconds, 2)
+        return report
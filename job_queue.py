@@ -0,0 +1,509 @@
+import datetime
+import importlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Dict, Any, Optional, List, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Queue / worker settings
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "job_queue.db")
+JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", "20"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Workers refresh the heartbeat of the job they run this often; a job whose heartbeat is
+# older than JOB_HEARTBEAT_TIMEOUT has lost its worker, even if the pid was reused since
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", "60"))
+# Events of finished jobs are kept this long (for SSE replays), then deleted
+JOB_EVENTS_RETENTION_SECONDS = int(os.getenv("JOB_EVENTS_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# How often the scheduler's monitor prunes them
+EVENTS_PRUNE_INTERVAL = 3600
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("success", "failed")
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its configured capacity."""
+
+    def __init__(self, queued: int, max_size: int):
+        self.queued = queued
+        self.max_size = max_size
+        # Position the job would have taken had there been room for it
+        self.queue_position = queued + 1
+        super().__init__(f"Job queue is full ({queued}/{max_size} jobs waiting)")
+
+
+class JobQueue:
+    """
+    Bounded, persistent FIFO job queue backed by SQLite.
+
+    Every job keeps its API-visible state (the dict previously held in
+    `active_jobs`) as a JSON payload, so status survives API restarts and
+    can be shared between the API process and the worker processes.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB, max_size: int = JOB_QUEUE_MAX_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT UNIQUE NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    worker_id TEXT,
+                    worker_pid INTEGER,
+                    heartbeat_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            # Queues created before workers recorded their pid
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "worker_pid" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker_pid INTEGER")
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_seq ON jobs (status, seq)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_events_session ON job_events (session_id, id)")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = json.loads(row["payload"])
+        job["status"] = row["status"]
+        job["attempts"] = row["attempts"]
+        return job
+
+    def enqueue(self, job: Dict[str, Any]) -> int:
+        """
+        Add a job to the queue and return its 1-based queue position.
+        Raises QueueFullError when the number of waiting jobs is at capacity.
+        """
+        now = datetime.datetime.now().isoformat()
+        payload = dict(job, status="queued")
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock so the capacity check and insert are atomic
+            conn.execute("BEGIN IMMEDIATE")
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_size:
+                conn.execute("ROLLBACK")
+                raise QueueFullError(queued, self.max_size)
+            conn.execute(
+                "INSERT INTO jobs (session_id, status, payload, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job["session_id"], json.dumps(payload), now, now)
+            )
+            conn.execute("COMMIT")
+            return queued + 1
+        finally:
+            conn.close()
+
+    def claim_next(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest queued job and mark it as running, recording
+        the claiming worker (its pid and a first heartbeat) so the job can be
+        failed if it dies.
+        """
+        now = datetime.datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            payload = json.loads(row["payload"])
+            payload["status"] = "running"
+            payload["message"] = "Job picked up by worker"
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, worker_pid = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1, payload = ?, updated_at = ? WHERE seq = ?",
+                (worker_id, os.getpid(), time.time(), json.dumps(payload), now, row["seq"])
+            )
+            self._insert_event(conn, row["session_id"], "status", {
+                "status": "running",
+                "message": payload["message"]
+            }, now)
+            conn.execute("COMMIT")
+            payload["attempts"] = row["attempts"] + 1
+            return payload
+        finally:
+            conn.close()
+
+    def heartbeat(self, worker_id: str):
+        """Record that a worker is still running the job it claimed."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker_id = ?",
+                (time.time(), worker_id)
+            )
+        finally:
+            conn.close()
+
+    def update(self, session_id: str, **fields):
+        """Merge fields into a job's payload (and status column when given)."""
+        now = datetime.datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT payload, status FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return
+            payload = json.loads(row["payload"])
+            payload.update(fields)
+            status = fields.get("status", row["status"])
+            conn.execute(
+                "UPDATE jobs SET status = ?, payload = ?, updated_at = ? WHERE session_id = ?",
+                (status, json.dumps(payload), now, session_id)
+            )
+            if "status" in fields or "message" in fields:
+                self._insert_event(conn, session_id, "status", {
+                    "status": status,
+                    "message": payload.get("message", "")
+                }, now)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert_event(conn: sqlite3.Connection, session_id: str, event: str, data: Dict[str, Any], now: str):
+        conn.execute(
+            "INSERT INTO job_events (session_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, event, json.dumps(data, default=str), now)
+        )
+
+    def add_event(self, session_id: str, event: str, data: Dict[str, Any]):
+        """Append a progress event (task transition, partial output, log line) for a job."""
+        conn = self._connect()
+        try:
+            self._insert_event(conn, session_id, event, data, datetime.datetime.now().isoformat())
+        finally:
+            conn.close()
+
+    def events_since(self, session_id: str, after_id: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """Get a job's events with an id greater than after_id, oldest first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, event, data, created_at FROM job_events "
+                "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (session_id, after_id, limit)
+            ).fetchall()
+            return [{
+                "id": row["id"],
+                "event": row["event"],
+                "data": json.loads(row["data"]),
+                "created_at": row["created_at"]
+            } for row in rows]
+        finally:
+            conn.close()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by session ID, including its current queue position if still waiting."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._row_to_job(row)
+            if row["status"] == "queued":
+                job["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND seq <= ?", (row["seq"],)
+                ).fetchone()[0]
+            return job
+        finally:
+            conn.close()
+
+    def list_jobs(self, statuses: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """List jobs in submission order, optionally filtered by status."""
+        conn = self._connect()
+        try:
+            if statuses:
+                placeholders = ",".join("?" for _ in statuses)
+                rows = conn.execute(
+                    f"SELECT * FROM jobs WHERE status IN ({placeholders}) ORDER BY seq", tuple(statuses)
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY seq").fetchall()
+            return [self._row_to_job(row) for row in rows]
+        finally:
+            conn.close()
+
+    def fail_worker_jobs(self, worker_id: str, message: str) -> int:
+        """Mark the jobs a (dead) worker had claimed as failed. Returns how many there were."""
+        now = datetime.datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'running' AND worker_id = ?", (worker_id,)
+            ).fetchall()
+            for row in rows:
+                payload = json.loads(row["payload"])
+                payload["status"] = "failed"
+                payload["message"] = message
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', payload = ?, updated_at = ? WHERE seq = ?",
+                    (json.dumps(payload), now, row["seq"])
+                )
+                self._insert_event(conn, row["session_id"], "status", {"status": "failed", "message": message}, now)
+            conn.execute("COMMIT")
+            return len(rows)
+        finally:
+            conn.close()
+
+    def recover(self, max_attempts: int = JOB_MAX_ATTEMPTS) -> Dict[str, int]:
+        """
+        Recover jobs interrupted by a restart. Jobs left `running` by a worker
+        that is no longer alive are re-queued, unless they already used up their
+        attempts, in which case they are marked as failed. A worker is alive
+        while its pid runs and it keeps the job's heartbeat fresh, so a reused
+        pid doesn't keep a job running forever. Jobs still running in a live
+        worker (e.g. one of another API process) and jobs still `queued` are
+        kept as they are. Events of long-finished jobs are pruned.
+        """
+        self.prune_events()
+        now = datetime.datetime.now().isoformat()
+        requeued = 0
+        failed = 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if _worker_alive(row["worker_pid"], row["heartbeat_at"]):
+                    continue
+                payload = json.loads(row["payload"])
+                if row["attempts"] >= max_attempts:
+                    status = "failed"
+                    payload["message"] = f"Job interrupted by a restart after {row['attempts']} attempt(s)"
+                    failed += 1
+                else:
+                    status = "queued"
+                    payload["message"] = "Job re-queued after a restart"
+                    requeued += 1
+                payload["status"] = status
+                conn.execute(
+                    "UPDATE jobs SET status = ?, payload = ?, worker_id = NULL, updated_at = ? WHERE seq = ?",
+                    (status, json.dumps(payload), now, row["seq"])
+                )
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return {"requeued": requeued, "failed": failed, "queued": queued}
+
+    def prune_events(self, retention_seconds: int = JOB_EVENTS_RETENTION_SECONDS) -> int:
+        """Delete the events of jobs that finished more than retention_seconds ago. Returns how many."""
+        cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=retention_seconds)).isoformat()
+        conn = self._connect()
+        try:
+            placeholders = ", ".join("?" for _ in FINAL_STATUSES)
+            return conn.execute(
+                "DELETE FROM job_events WHERE session_id IN "
+                f"(SELECT session_id FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?)",
+                (*FINAL_STATUSES, cutoff)
+            ).rowcount
+        finally:
+            conn.close()
+
+
+def _worker_alive(pid: Optional[int], heartbeat_at: Optional[float],
+                  timeout: float = JOB_HEARTBEAT_TIMEOUT) -> bool:
+    """Whether the worker that claimed a job still runs it: its pid is alive and its heartbeat recent."""
+    if heartbeat_at is None or time.time() - heartbeat_at > timeout:
+        return False
+    return _pid_alive(pid)
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """Whether a worker process with this pid is still running (on this host)."""
+    if not pid or os.name == "nt":
+        # Signal 0 is not a liveness probe on Windows; treat the worker as gone
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _import_callable(path: str):
+    module_name, func_name = path.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _heartbeat_loop(queue: JobQueue, worker_id: str, stop_event, interval: float = JOB_HEARTBEAT_INTERVAL):
+    while not stop_event.wait(interval):
+        try:
+            queue.heartbeat(worker_id)
+        except sqlite3.Error as e:
+            print(f"Job worker {worker_id} heartbeat failed: {str(e)}")
+
+
+def _worker_loop(handler_path: str, db_path: str, max_size: int, stop_event, poll_interval: float,
+                 warmup_path: Optional[str] = None, worker_id: Optional[str] = None):
+    """Worker process main loop: claim jobs from the queue and run them one at a time."""
+    handler = _import_callable(handler_path)
+    queue = JobQueue(db_path, max_size)
+    worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    print(f"Job worker {worker_id} started")
+
+    # Beats from a thread, so a long job (blocked in the handler) keeps its heartbeat fresh
+    heartbeat = threading.Thread(
+        target=_heartbeat_loop, args=(queue, worker_id, stop_event), name="job-heartbeat", daemon=True
+    )
+    heartbeat.start()
+
+    if warmup_path:
+        try:
+            print(f"Job worker {worker_id} warm-up: {_import_callable(warmup_path)()}")
+        except Exception as e:
+            # A failed warm-up only means the first job pays for the set-up itself
+            print(f"Job worker {worker_id} warm-up failed: {str(e)}")
+
+    while not stop_event.is_set():
+        job = queue.claim_next(worker_id)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        session_id = job["session_id"]
+        try:
+            handler(job)
+        except Exception as e:
+            error_msg = f"Unhandled error in job worker: {str(e)}\n{traceback.format_exc()}"
+            print(error_msg)
+            queue.update(session_id, status="failed", message=error_msg)
+
+    print(f"Job worker {worker_id} stopped")
+
+
+class JobScheduler:
+    """
+    Runs a fixed pool of worker processes that consume jobs from a JobQueue.
+
+    The handler is given as a "module:function" path so that each worker
+    process imports it fresh (spawned processes do not share the API's
+    database clients or crew state). An optional warm-up callable, given the
+    same way, runs once in each worker before it starts claiming jobs.
+
+    A monitor thread replaces workers that die (OOM, a crash in native code)
+    and fails the job the dead worker had claimed, so the pool keeps its size
+    and the job's event stream ends. It also prunes the events of
+    long-finished jobs every EVENTS_PRUNE_INTERVAL seconds.
+    """
+
+    def __init__(self, queue: JobQueue, handler_path: str, num_workers: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL, warmup_path: Optional[str] = None):
+        self.queue = queue
+        self.handler_path = handler_path
+        self.warmup_path = warmup_path
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop_event = None
+        self._monitor_stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+        self._last_prune = time.time()
+        # (worker_id, process) per pool slot
+        self._workers: List[Tuple[str, multiprocessing.Process]] = []
+
+    def _spawn(self) -> Tuple[str, multiprocessing.Process]:
+        worker_id = uuid.uuid4().hex[:12]
+        process = self._ctx.Process(
+            target=_worker_loop,
+            args=(self.handler_path, self.queue.db_path, self.queue.max_size,
+                  self._stop_event, self.poll_interval, self.warmup_path, worker_id),
+            daemon=True
+        )
+        process.start()
+        return worker_id, process
+
+    def start(self):
+        if self._workers:
+            return
+        self._stop_event = self._ctx.Event()
+        self._workers = [self._spawn() for _ in range(self.num_workers)]
+        self._monitor_stop.clear()
+        self._monitor = threading.Thread(target=self._supervise, name="job-worker-monitor", daemon=True)
+        self._monitor.start()
+        print(f"Started {self.num_workers} job worker process(es)")
+
+    def _supervise(self):
+        while not self._monitor_stop.wait(self.poll_interval):
+            for slot, (worker_id, process) in enumerate(self._workers):
+                if process.is_alive() or self._stop_event.is_set():
+                    continue
+                message = f"Job worker exited unexpectedly (exit code {process.exitcode})"
+                failed = self.queue.fail_worker_jobs(worker_id, message)
+                print(f"Job worker {worker_id} died (exit code {process.exitcode}, {failed} job(s) failed); restarting it")
+                self._workers[slot] = self._spawn()
+            if time.time() - self._last_prune > EVENTS_PRUNE_INTERVAL:
+                self._last_prune = time.time()
+                try:
+                    self.queue.prune_events()
+                except sqlite3.Error as e:
+                    print(f"Pruning job events failed: {str(e)}")
+
+    def stop(self, timeout: float = 10.0):
+        """Stop accepting new work and wait for workers to exit. Running jobs are recovered on next start."""
+        if not self._workers:
+            return
+        self._stop_event.set()
+        self._monitor_stop.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        deadline = time.time() + timeout
+        for _, process in self._workers:
+            process.join(max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+
+    def alive_workers(self) -> int:
+        return sum(1 for _, process in self._workers if process.is_alive())
@@ -1,4 +1,7 @@
 from config.tools.fetch_data_tool import DocumentSearchTool
+from config.tools.vector_backends import LocalVectorBackend, LOCAL_VECTOR_DIR
+from config.tools.sparse_index import load_sparse_index
+from config.tools.reranker import get_reranker, RERANK_SEARCH_RESULTS
 import datetime
 from crewai import Agent, Crew, Task
 import yaml
@@ -8,6 +11,10 @@ from typing import Dict
 import os
 import signal
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from openai import OpenAI
 from dotenv import load_dotenv
 from crewai import Agent, Task
@@ -18,7 +25,7 @@ import agentops
 # Add signal handler for graceful termination
 def signal_handler(sig, frame):
     print('\nCleaning up and exiting...')
-    if 'session' in globals():
+    if session:
         try:
             agentops.end_session()
             print("AgentOps session ended gracefully")
@@ -26,10 +33,6 @@ def signal_handler(sig, frame):
             print(f"Error ending AgentOps session: {e}")
     sys.exit(0)
 
-# Register signal handlers
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
 # Load environment variables first
 load_dotenv()
 
@@ -38,43 +41,58 @@ os.environ['OPENAI_MODEL_NAME'] = 'gpt-4o'
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# Initialize AgentOps with more complete configuration
-try:
-    agentops.init(
-        api_key=os.getenv("AGENTOPS_API_KEY"),
-        fail_safe=True,
-        default_tags=["legal_compliance_check", "employment_agreement", "gpt-4o"],
-        log_level="INFO",  # Set to INFO to see more detailed logs including URLs
-        endpoint="https://api.agentops.ai",  # Explicitly set the endpoint
-    )
-
-    # Output the dashboard URL
-    print("AgentOps Dashboard URL: https://app.agentops.ai")
-
-    # Start a session and capture the session object
-    session = agentops.start_session(tags=["execution_run"])
+# AgentOps session, started lazily by init_agentops() on first crew build
+session = None
+session_id = None
+_agentops_initialized = False
+_agentops_lock = threading.Lock()
+
+def init_agentops():
+    """Initialize AgentOps and start a session once per process (no network calls at import time)."""
+    global session, session_id, _agentops_initialized
+    with _agentops_lock:
+        if _agentops_initialized:
+            return session
+        _agentops_initialized = True
+
+        # Initialize AgentOps with more complete configuration
+        try:
+            agentops.init(
+                api_key=os.getenv("AGENTOPS_API_KEY"),
+                fail_safe=True,
+                default_tags=["legal_compliance_check", "employment_agreement", "gpt-4o"],
+                log_level="INFO",  # Set to INFO to see more detailed logs including URLs
+                endpoint="https://api.agentops.ai",  # Explicitly set the endpoint
+            )
+
+            # Output the dashboard URL
+            print("AgentOps Dashboard URL: https://app.agentops.ai")
+
+            # Start a session and capture the session object
+            session = agentops.start_session(tags=["execution_run"])
+
+            # Extract the trace ID from the span object, which provides a better identifier
+            session_id = "unknown"
+            try:
+                if hasattr(session, 'span') and hasattr(session.span, 'context') and hasattr(session.span.context, 'trace_id'):
+                    # Convert the hex trace ID to a readable string
+                    trace_id_hex = format(session.span.context.trace_id, 'x')
+                    session_id = trace_id_hex
+                elif hasattr(session, 'id'):
+                    session_id = session.id
+                elif hasattr(session, 'session_id'):
+                    session_id = session.session_id
+            except Exception as e:
+                print(f"Info: Could not extract detailed session ID: {str(e)}")
 
-    # Extract the trace ID from the span object, which provides a better identifier
-    session_id = "unknown"
-    try:
-        if hasattr(session, 'span') and hasattr(session.span, 'context') and hasattr(session.span.context, 'trace_id'):
-            # Convert the hex trace ID to a readable string
-            trace_id_hex = format(session.span.context.trace_id, 'x')
-            session_id = trace_id_hex
-        elif hasattr(session, 'id'):
-            session_id = session.id
-        elif hasattr(session, 'session_id'):
-            session_id = session.session_id
-    except Exception as e:
-        print(f"Info: Could not extract detailed session ID: {str(e)}")
-
-    print(f"AgentOps session started - Session ID: {session_id}")
-    print(f"Check your session at: https://app.agentops.ai/sessions")
-except Exception as e:
-    print(f"Warning: AgentOps initialization failed: {str(e)}")
-    print("Continuing without AgentOps telemetry...")
-    session = None
-    session_id = None
+            print(f"AgentOps session started - Session ID: {session_id}")
+            print(f"Check your session at: https://app.agentops.ai/sessions")
+        except Exception as e:
+            print(f"Warning: AgentOps initialization failed: {str(e)}")
+            print("Continuing without AgentOps telemetry...")
+            session = None
+            session_id = None
+        return session
 
 # Clean up and simplify - remove all debug printing
 files = {
@@ -91,26 +109,46 @@ agents_config = configs['agents']
 tasks_config = configs['tasks']
 
 # ---------------------- Define Tools ------------------------
-qdrant = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
-
-appeal_search_tool = DocumentSearchTool(
-    index_name="judgments-index",
-    environment="custom-embeddings", 
-    top_k=5,
-    similarity_threshold=0.7,
-    namespace="appeal_court"
-)
-
-supreme_search_tool = DocumentSearchTool(
-    index_name="judgments-index",
-    environment="custom-embeddings", 
-    top_k=5,
-    similarity_threshold=0.7,
-    namespace="supreme_court"
-)
+# Remote clients are created on first use and then shared by every crew in the process
+@lru_cache(maxsize=None)
+def get_qdrant_client():
+    return QdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY")
+    )
+
+@lru_cache(maxsize=None)
+def get_local_vector_backend():
+    """In-process store exported from Pinecone/Qdrant, used when LOCAL_VECTOR_DIR is set."""
+    return LocalVectorBackend(LOCAL_VECTOR_DIR) if LOCAL_VECTOR_DIR else None
+
+@lru_cache(maxsize=None)
+def get_appeal_search_tool():
+    return DocumentSearchTool(
+        index_name="judgments-index",
+        environment="custom-embeddings", 
+        top_k=5,
+        similarity_threshold=0.7,
+        namespace="appeal_court",
+        backend=get_local_vector_backend(),
+        # Built over the namespace's chunk ids by `python -m config.tools.vector_backends ... --sparse-index`
+        sparse_index=load_sparse_index("appeal_court"),
+        reranker=get_reranker() if RERANK_SEARCH_RESULTS else None
+    )
+
+@lru_cache(maxsize=None)
+def get_supreme_search_tool():
+    return DocumentSearchTool(
+        index_name="judgments-index",
+        environment="custom-embeddings", 
+        top_k=5,
+        similarity_threshold=0.7,
+        namespace="supreme_court",
+        backend=get_local_vector_backend(),
+        # Built over the namespace's chunk ids by `python -m config.tools.vector_backends ... --sparse-index`
+        sparse_index=load_sparse_index("supreme_court"),
+        reranker=get_reranker() if RERANK_SEARCH_RESULTS else None
+    )
 
 def get_openai_embedding(text):
     response = client.embeddings.create(
@@ -126,15 +164,64 @@ law_knowledge_base_collection_name = "legal-docs"
 # Default PDF path - can be overridden
 pdf_path = "test_pdf/Nathaniel - Employment Agreement - Standord (1).pdf"
 
-pdf_search_tool = PDFSearchTool()
+# Per-job report and crew log files are written under this directory
+JOB_OUTPUT_DIR = os.getenv("JOB_OUTPUT_DIR", "job_outputs")
+
+# Run the three precedent-retrieval tasks concurrently (they only depend on the vector queries)
+PARALLEL_RETRIEVAL = os.getenv("CREW_PARALLEL_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+
+# Characters of each finished task's output included in progress events
+TASK_OUTPUT_PREVIEW_CHARS = int(os.getenv("TASK_OUTPUT_PREVIEW_CHARS", "2000"))
+
+@lru_cache(maxsize=None)
+def get_law_knowledge_base_tool():
+    if LOCAL_VECTOR_DIR:
+        # The exported collection is a namespace of the local store
+        return DocumentSearchTool(
+            index_name=law_knowledge_base_collection_name,
+            environment="local",
+            top_k=3,
+            similarity_threshold=0.35,
+            namespace=law_knowledge_base_collection_name,
+            backend=get_local_vector_backend(),
+            embedding_model="text-embedding-3-small",
+            # Built by qdrant_upsert.py over the same chunk ids
+            sparse_index=load_sparse_index(law_knowledge_base_collection_name)
+        )
+    return QdrantVectorSearchTool(
+        qdrant_url=os.getenv("QDRANT_URL"),
+        qdrant_api_key=os.getenv("QDRANT_API_KEY"),
+        collection_name=law_knowledge_base_collection_name,
+        limit=3,
+        score_threshold=0.35
+    )
 
-law_knowledge_base = QdrantVectorSearchTool(
-    qdrant_url=os.getenv("QDRANT_URL"),
-    qdrant_api_key=os.getenv("QDRANT_API_KEY"),
-    collection_name=law_knowledge_base_collection_name,
-    limit=3,
-    score_threshold=0.35
-)
+def warm_up(timeout=None):
+    """
+    Create AgentOps and the shared search tools concurrently, so the first job
+    doesn't pay for them one after another. Returns per-component timings in seconds.
+    """
+    components = {
+        "agentops": init_agentops,
+        "supreme_search_tool": get_supreme_search_tool,
+        "appeal_search_tool": get_appeal_search_tool,
+        "law_knowledge_base_tool": get_law_knowledge_base_tool,
+    }
+
+    def timed(factory):
+        start = time.perf_counter()
+        factory()
+        return round(time.perf_counter() - start, 3)
+
+    timings = {}
+    with ThreadPoolExecutor(max_workers=len(components)) as executor:
+        futures = {name: executor.submit(timed, factory) for name, factory in components.items()}
+        for name, future in futures.items():
+            try:
+                timings[name] = future.result(timeout=timeout)
+            except Exception as e:
+                timings[name] = f"failed: {str(e)}"
+    return timings
 
 # ---------------------- Define Pydantic Model for JSON Output ------------------------
 class ClauseJSONFile(BaseModel):
@@ -156,195 +243,342 @@ class ClauseJSONFile(BaseModel):
             }
         }
 
-# ---------------------- Define Agents ------------------------
-agreement_summarizer = Agent(
-    config=agents_config['agreement_summarizer'],
-    tools=[pdf_search_tool],
-    verbose=True,
-    respect_context_window=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-agreement_clause_extractor = Agent(
-    config=agents_config['agreement_clause_extractor'],
-    tools=[pdf_search_tool],
-    verbose=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-legal_clause_validator = Agent(
-    config=agents_config['legal_clause_validator'],
-    tools=[pdf_search_tool],
-    verbose=True,
-    allow_delegation=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-create_vector_query_agent = Agent(
-    config=agents_config['create_vector_query_agent'],
-    verbose=True,
-    allow_delegation=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-supreme_court_judgements_extractor = Agent(
-    config=agents_config['supreme_court_judgements_extractor'],
-    tools=[supreme_search_tool],
-    verbose=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-appeal_court_judgements_extractor = Agent(
-    config=agents_config['appeal_court_judgements_extractor'],
-    tools=[appeal_search_tool],
-    verbose=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-law_knowledge_base_extractor = Agent(
-    config=agents_config['law_knowledge_base_extractor'],
-    tools=[law_knowledge_base],
-    verbose=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-extracted_data_validator = Agent(
-    config=agents_config['extracted_data_validator'],
-    verbose=True,
-    allow_delegation=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-final_compliance_reporte_creation_agent = Agent(
-    config=agents_config['final_compliance_reporte_creation_agent'],
-    verbose=True,
-    llm="gpt-4o-mini",
-    max_retry_limit=3
-)
-
-# ---------------------- Define Tasks ------------------------
-agreement_summarizer_task = Task(
-    config=tasks_config['agreement_summarizer_task'],
-    agent=agreement_summarizer,
-    tools=[pdf_search_tool],
-    max_retries=5
-)
-
-agreement_clause_extractor_task = Task(
-    config=tasks_config['agreement_clause_extractor_task'],
-    agent=agreement_clause_extractor,
-    tools=[pdf_search_tool],
-    output_json=ClauseJSONFile,
-    max_retries=5
-)
-
-legal_clause_validator_task = Task(
-    config=tasks_config['legal_clause_validator_task'],
-    agent=legal_clause_validator,
-    tools=[pdf_search_tool],
-    retry_count=3,
-    max_retries=5
-)
-
-create_vector_query_task = Task(
-    config=tasks_config['create_vector_query_task'],
-    agent=create_vector_query_agent,
-    context=[
-        agreement_summarizer_task
-    ],
-    max_retries=5
-)
-
-supreme_court_judgements_extractor_task = Task(
-    config=tasks_config['supreme_court_judgements_extractor_task'],
-    agent=supreme_court_judgements_extractor,
-    tools=[supreme_search_tool],
-    context=[
-        create_vector_query_task
-    ],
-    max_retries=5
-)
-
-appeal_court_judgements_extractor_task = Task(
-    config=tasks_config['appeal_court_judgements_extractor_task'],
-    agent=appeal_court_judgements_extractor,
-    tools=[appeal_search_tool],
-    context=[
-        create_vector_query_task
-    ],
-    max_retries=5
-)
-
-law_knowledge_base_extractor_task = Task(
-    config=tasks_config['law_knowledge_base_extractor_task'],
-    agent=law_knowledge_base_extractor,
-    tools=[law_knowledge_base],
-    context=[
-        create_vector_query_task
-    ],
-    max_retries=5
-)
-
-extracted_data_validator_task = Task(
-    config=tasks_config['extracted_data_validator_task'],
-    agent=extracted_data_validator,
-    context=[
-        supreme_court_judgements_extractor_task,
-        appeal_court_judgements_extractor_task,
-        law_knowledge_base_extractor_task
-    ],
-    max_retries=5
-)
-
-final_compliance_reporte_creation_task = Task(
-    config=tasks_config['final_compliance_reporte_creation_task'],
-    agent=final_compliance_reporte_creation_agent,
-    context=[
-        extracted_data_validator_task,
-        supreme_court_judgements_extractor_task,
-        appeal_court_judgements_extractor_task,
-        law_knowledge_base_extractor_task
-    ],
-    output_file="final_compliance_reporte.md",
-    max_retries=5
-)
-
-# ---------------------- Define Crew ------------------------
-crew = Crew(
-    agents=[
-        agreement_summarizer,
-        agreement_clause_extractor,
-        legal_clause_validator,
-        create_vector_query_agent,
-        supreme_court_judgements_extractor,
-        appeal_court_judgements_extractor,
-        law_knowledge_base_extractor,
-        extracted_data_validator,
-        final_compliance_reporte_creation_agent
-    ],
-    tasks=[
-        agreement_summarizer_task,
-        agreement_clause_extractor_task,
-        legal_clause_validator_task,
-        create_vector_query_task,
-        supreme_court_judgements_extractor_task,
-        appeal_court_judgements_extractor_task,
-        law_knowledge_base_extractor_task,
-        extracted_data_validator_task,
-        final_compliance_reporte_creation_task
-    ],
-    verbose=True,
-    output_log_file="main_exec",
-    planning_llm="gpt-4o",
-)
+def job_output_paths(job_id):
+    """
+    Get the report and crew log paths for a job.
+
+    Args:
+        job_id (str): Identifier of the job (the API session ID)
+
+    Returns:
+        tuple: (report_path, log_path) inside the job's own output directory
+    """
+    job_dir = os.path.join(JOB_OUTPUT_DIR, job_id)
+    return (
+        os.path.join(job_dir, "final_compliance_reporte.md"),
+        os.path.join(job_dir, "main_exec.txt")
+    )
+
+# ---------------------- Crew Events ------------------------
+# Only one crew runs per worker process, so progress events are forwarded to a
+# single process-wide callback(event, data) set for the duration of a job.
+_crew_event_callback = None
+_crew_event_listeners_registered = False
+
+def _task_label(task):
+    if task is None:
+        return ""
+    return getattr(task, "name", None) or (getattr(task, "description", "") or "")[:80]
+
+def _emit_crew_event(event, data):
+    callback = _crew_event_callback
+    if callback:
+        try:
+            callback(event, data)
+        except Exception as e:
+            print(f"Warning: crew event callback failed: {str(e)}")
+
+def _register_crew_event_listeners():
+    """Subscribe to the CrewAI event bus once per process. Returns False if the bus is unavailable."""
+    global _crew_event_listeners_registered
+    if _crew_event_listeners_registered:
+        return True
+    try:
+        from crewai.utilities.events import (
+            crewai_event_bus,
+            TaskStartedEvent,
+            TaskFailedEvent,
+            ToolUsageStartedEvent,
+            ToolUsageErrorEvent,
+        )
+    except ImportError:
+        return False
+
+    @crewai_event_bus.on(TaskStartedEvent)
+    def on_task_started(source, event):
+        task = getattr(event, "task", None)
+        agent = getattr(task, "agent", None)
+        _emit_crew_event("task_started", {
+            "task": _task_label(task),
+            "agent": getattr(agent, "role", "").strip()
+        })
+
+    @crewai_event_bus.on(TaskFailedEvent)
+    def on_task_failed(source, event):
+        _emit_crew_event("task_failed", {
+            "task": _task_label(getattr(event, "task", None)),
+            "error": str(getattr(event, "error", ""))
+        })
+
+    @crewai_event_bus.on(ToolUsageStartedEvent)
+    def on_tool_started(source, event):
+        _emit_crew_event("tool_started", {
+            "tool": getattr(event, "tool_name", ""),
+            "agent": getattr(event, "agent_role", "")
+        })
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def on_tool_error(source, event):
+        _emit_crew_event("tool_error", {
+            "tool": getattr(event, "tool_name", ""),
+            "error": str(getattr(event, "error", ""))
+        })
+
+    _crew_event_listeners_registered = True
+    return True
+
+def set_crew_event_callback(callback):
+    """
+    Forward crew progress events to callback(event, data), or stop forwarding when None.
+
+    Task start/failure and tool usage come from the CrewAI event bus; completed
+    task outputs are delivered through the crew's task_callback (see create_crew).
+    """
+    global _crew_event_callback
+    _crew_event_callback = callback
+    if callback:
+        _register_crew_event_listeners()
+
+def _on_task_completed(output):
+    raw = getattr(output, "raw", None) or str(output)
+    _emit_crew_event("task_completed", {
+        "task": getattr(output, "name", None) or (getattr(output, "description", "") or "")[:80],
+        "agent": (getattr(output, "agent", "") or "").strip(),
+        "output": raw[:TASK_OUTPUT_PREVIEW_CHARS],
+        "truncated": len(raw) > TASK_OUTPUT_PREVIEW_CHARS
+    })
+
+# ---------------------- Crew Factory ------------------------
+def create_crew(input_file_path=None, report_path="final_compliance_reporte.md", log_path="main_exec",
+                parallel_retrieval=None):
+    """
+    Build a fresh Crew with its own agents, tasks and output files.
+
+    The YAML configs and the remote search tools are created once per process
+    and shared; everything holding per-run state (agents, task outputs, the PDF
+    search index and the output files) is created per call, so concurrent
+    analyses never share state.
+
+    Args:
+        input_file_path (str): PDF the crew analyzes. Scopes the PDF search tool to this file.
+        report_path (str): Where the final compliance report is written.
+        log_path (str): Where CrewAI writes the execution log.
+        parallel_retrieval (bool): Run the supreme court, appeal court and law knowledge base
+            retrieval tasks concurrently. They all depend only on create_vector_query_task and
+            are joined again at extracted_data_validator_task. Defaults to PARALLEL_RETRIEVAL.
+
+    Returns:
+        Crew: A crew ready for kickoff
+    """
+    for path in (report_path, log_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    if parallel_retrieval is None:
+        parallel_retrieval = PARALLEL_RETRIEVAL
+
+    init_agentops()
+    supreme_search_tool = get_supreme_search_tool()
+    appeal_search_tool = get_appeal_search_tool()
+    law_knowledge_base = get_law_knowledge_base_tool()
+
+    pdf_search_tool = PDFSearchTool(pdf=input_file_path) if input_file_path else PDFSearchTool()
+
+    # ---------------------- Define Agents ------------------------
+    agreement_summarizer = Agent(
+        config=agents_config['agreement_summarizer'],
+        tools=[pdf_search_tool],
+        verbose=True,
+        respect_context_window=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    agreement_clause_extractor = Agent(
+        config=agents_config['agreement_clause_extractor'],
+        tools=[pdf_search_tool],
+        verbose=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    legal_clause_validator = Agent(
+        config=agents_config['legal_clause_validator'],
+        tools=[pdf_search_tool],
+        verbose=True,
+        allow_delegation=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    create_vector_query_agent = Agent(
+        config=agents_config['create_vector_query_agent'],
+        verbose=True,
+        allow_delegation=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    supreme_court_judgements_extractor = Agent(
+        config=agents_config['supreme_court_judgements_extractor'],
+        tools=[supreme_search_tool],
+        verbose=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    appeal_court_judgements_extractor = Agent(
+        config=agents_config['appeal_court_judgements_extractor'],
+        tools=[appeal_search_tool],
+        verbose=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    law_knowledge_base_extractor = Agent(
+        config=agents_config['law_knowledge_base_extractor'],
+        tools=[law_knowledge_base],
+        verbose=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    extracted_data_validator = Agent(
+        config=agents_config['extracted_data_validator'],
+        verbose=True,
+        allow_delegation=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    final_compliance_reporte_creation_agent = Agent(
+        config=agents_config['final_compliance_reporte_creation_agent'],
+        verbose=True,
+        llm="gpt-4o-mini",
+        max_retry_limit=3
+    )
+
+    # ---------------------- Define Tasks ------------------------
+    agreement_summarizer_task = Task(
+        config=tasks_config['agreement_summarizer_task'],
+        agent=agreement_summarizer,
+        tools=[pdf_search_tool],
+        max_retries=5
+    )
+
+    agreement_clause_extractor_task = Task(
+        config=tasks_config['agreement_clause_extractor_task'],
+        agent=agreement_clause_extractor,
+        tools=[pdf_search_tool],
+        output_json=ClauseJSONFile,
+        max_retries=5
+    )
+
+    legal_clause_validator_task = Task(
+        config=tasks_config['legal_clause_validator_task'],
+        agent=legal_clause_validator,
+        tools=[pdf_search_tool],
+        retry_count=3,
+        max_retries=5
+    )
+
+    create_vector_query_task = Task(
+        config=tasks_config['create_vector_query_task'],
+        agent=create_vector_query_agent,
+        context=[
+            agreement_summarizer_task
+        ],
+        max_retries=5
+    )
+
+    supreme_court_judgements_extractor_task = Task(
+        config=tasks_config['supreme_court_judgements_extractor_task'],
+        agent=supreme_court_judgements_extractor,
+        tools=[supreme_search_tool],
+        context=[
+            create_vector_query_task
+        ],
+        async_execution=parallel_retrieval,
+        max_retries=5
+    )
+
+    appeal_court_judgements_extractor_task = Task(
+        config=tasks_config['appeal_court_judgements_extractor_task'],
+        agent=appeal_court_judgements_extractor,
+        tools=[appeal_search_tool],
+        context=[
+            create_vector_query_task
+        ],
+        async_execution=parallel_retrieval,
+        max_retries=5
+    )
+
+    law_knowledge_base_extractor_task = Task(
+        config=tasks_config['law_knowledge_base_extractor_task'],
+        agent=law_knowledge_base_extractor,
+        tools=[law_knowledge_base],
+        context=[
+            create_vector_query_task
+        ],
+        async_execution=parallel_retrieval,
+        max_retries=5
+    )
+
+    # Joins the retrieval tasks: waits for all three when they run asynchronously
+    extracted_data_validator_task = Task(
+        config=tasks_config['extracted_data_validator_task'],
+        agent=extracted_data_validator,
+        context=[
+            supreme_court_judgements_extractor_task,
+            appeal_court_judgements_extractor_task,
+            law_knowledge_base_extractor_task
+        ],
+        max_retries=5
+    )
+
+    final_compliance_reporte_creation_task = Task(
+        config=tasks_config['final_compliance_reporte_creation_task'],
+        agent=final_compliance_reporte_creation_agent,
+        context=[
+            extracted_data_validator_task,
+            supreme_court_judgements_extractor_task,
+            appeal_court_judgements_extractor_task,
+            law_knowledge_base_extractor_task
+        ],
+        output_file=report_path,
+        max_retries=5
+    )
+
+    # ---------------------- Define Crew ------------------------
+    return Crew(
+        agents=[
+            agreement_summarizer,
+            agreement_clause_extractor,
+            legal_clause_validator,
+            create_vector_query_agent,
+            supreme_court_judgements_extractor,
+            appeal_court_judgements_extractor,
+            law_knowledge_base_extractor,
+            extracted_data_validator,
+            final_compliance_reporte_creation_agent
+        ],
+        tasks=[
+            agreement_summarizer_task,
+            agreement_clause_extractor_task,
+            legal_clause_validator_task,
+            create_vector_query_task,
+            supreme_court_judgements_extractor_task,
+            appeal_court_judgements_extractor_task,
+            law_knowledge_base_extractor_task,
+            extracted_data_validator_task,
+            final_compliance_reporte_creation_task
+        ],
+        verbose=True,
+        output_log_file=log_path,
+        planning_llm="gpt-4o",
+        task_callback=_on_task_completed,
+    )
 
 # Function to run the crew pipeline (instead of running it automatically on import)
 def run_crew_pipeline(input_file_path=None):
@@ -366,7 +600,7 @@ def run_crew_pipeline(input_file_path=None):
     print(f"Starting CrewAI pipeline on file: {pdf_path}")
     
     try:
-
+        crew = create_crew(input_file_path=pdf_path)
         result = crew.kickoff(
             inputs={
                 "input_file_path": pdf_path,
@@ -395,4 +629,8 @@ def run_crew_pipeline(input_file_path=None):
 
 # Only run if this file is executed directly (not when imported)
 if __name__ == "__main__":
+    # Register signal handlers
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
     run_crew_pipeline()
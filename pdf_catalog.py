@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Manifest written at the root of each catalogued tree
+PDF_CATALOG_FILE = ".pdf_catalog.json"
+CATALOG_VERSION = 1
+# Keep a file's hash while its size is unchanged, even if its mtime changed. A fresh
+# checkout (CI) gives every file a new mtime; files are assumed not to be rewritten
+# in place with the same size
+PDF_CATALOG_MATCH_SIZE_ONLY = os.getenv("PDF_CATALOG_MATCH_SIZE_ONLY", "false").lower() in ("1", "true", "yes")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PdfCatalog:
+    """
+    Filename index of a tree of scraped judgment PDFs, so a case's
+    `pdf_file_name` resolves with a dictionary lookup instead of a walk of the
+    whole tree. The index is persisted as a manifest (size, mtime and, once
+    computed, sha256 of each file) together with every directory's mtime; a
+    refresh only lists directories whose mtime changed, e.g. a newly scraped month.
+    With match_size_only, a file's hash is kept while its size is unchanged.
+    """
+
+    def __init__(self, base_dir: str, manifest_path: Optional[str] = None,
+                 match_size_only: bool = PDF_CATALOG_MATCH_SIZE_ONLY):
+        self.base_dir = os.path.abspath(base_dir)
+        self.manifest_path = manifest_path or os.path.join(self.base_dir, PDF_CATALOG_FILE)
+        self.match_size_only = match_size_only
+        # Directory (relative path) -> {"mtime", "subdirs", "files"}
+        self.directories: Dict[str, Dict] = {}
+        # File (relative path) -> {"size", "mtime", "sha256"?}
+        self.files: Dict[str, Dict] = {}
+        self._by_name: Dict[str, str] = {}
+        self.duplicates: Dict[str, List[str]] = {}
+
+    def load(self) -> bool:
+        """Read the persisted manifest; False if there is none (or it is outdated)."""
+        if not os.path.exists(self.manifest_path):
+            return False
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != CATALOG_VERSION:
+            return False
+        self.directories = manifest["directories"]
+        self.files = manifest["files"]
+        self._index()
+        return True
+
+    def save(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "directories": self.directories, "files": self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Bring the catalog up to date with the tree. Unchanged directories are
+        only stat'ed; changed ones are listed again. Returns counts of the
+        directories listed and files added / removed.
+        """
+        stats = {"listed": 0, "added": 0, "removed": 0}
+        seen_directories = set()
+        pending = [""]
+        while pending:
+            relative = pending.pop()
+            path = os.path.join(self.base_dir, relative)
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            seen_directories.add(relative)
+            known = self.directories.get(relative)
+            if known is None or known["mtime"] != mtime:
+                self._list_directory(relative, mtime, stats)
+            pending.extend(os.path.join(relative, name) for name in self.directories[relative]["subdirs"])
+
+        for relative in set(self.directories) - seen_directories:
+            # Removed directories take their files with them
+            for name in self.directories.pop(relative)["files"]:
+                if self.files.pop(os.path.join(relative, name), None) is not None:
+                    stats["removed"] += 1
+        self._index()
+        return stats
+
+    def _list_directory(self, relative: str, mtime: float, stats: Dict[str, int]):
+        stats["listed"] += 1
+        subdirs, files = [], []
+        with os.scandir(os.path.join(self.base_dir, relative)) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file() and entry.name.lower().endswith(".pdf"):
+                    files.append(entry.name)
+                    file_path = os.path.join(relative, entry.name)
+                    stat = entry.stat()
+                    known = self.files.get(file_path)
+                    if known is None:
+                        stats["added"] += 1
+                    if known is None or known["size"] != stat.st_size:
+                        self.files[file_path] = {"size": stat.st_size, "mtime": stat.st_mtime}
+                    elif known["mtime"] != stat.st_mtime:
+                        if self.match_size_only:
+                            known["mtime"] = stat.st_mtime
+                        else:
+                            self.files[file_path] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+        previous = self.directories.get(relative, {}).get("files", [])
+        for name in set(previous) - set(files):
+            if self.files.pop(os.path.join(relative, name), None) is not None:
+                stats["removed"] += 1
+        self.directories[relative] = {"mtime": mtime, "subdirs": sorted(subdirs), "files": sorted(files)}
+
+    def _index(self):
+        # The first path (in sorted order) wins when a filename occurs more than once
+        self._by_name = {}
+        self.duplicates = {}
+        for file_path in sorted(self.files):
+            name = os.path.basename(file_path)
+            if name in self._by_name:
+                self.duplicates.setdefault(name, [self._by_name[name]]).append(file_path)
+            else:
+                self._by_name[name] = file_path
+
+    def __len__(self):
+        return len(self.files)
+
+    def resolve(self, filename: str) -> Optional[str]:
+        """Full path of the PDF with this filename, or None."""
+        file_path = self._by_name.get(os.path.basename(filename))
+        return os.path.join(self.base_dir, file_path) if file_path else None
+
+    def sha256(self, filename: str) -> Optional[str]:
+        """Content hash of a catalogued PDF, computed once and kept in the manifest."""
+        file_path = self._by_name.get(os.path.basename(filename))
+        if file_path is None:
+            return None
+        entry = self.files[file_path]
+        if "sha256" not in entry:
+            entry["sha256"] = file_sha256(os.path.join(self.base_dir, file_path))
+        return entry["sha256"]
+
+
+@lru_cache(maxsize=None)
+def get_pdf_catalog(base_dir: str) -> PdfCatalog:
+    """
+    The catalog of a PDF tree: loaded from its manifest, refreshed and saved
+    again, once per process.
+    """
+    catalog = PdfCatalog(base_dir)
+    loaded = catalog.load()
+    stats = catalog.refresh()
+    if not loaded or stats["listed"]:
+        catalog.save()
+    print(f"PDF catalog of {base_dir}: {len(catalog)} files "
+          f"({stats['added']} added, {stats['removed']} removed, {stats['listed']} directories listed)")
+    if catalog.duplicates:
+        print(f"Warning: {len(catalog.duplicates)} PDF filenames occur more than once under {base_dir}")
+    return catalog
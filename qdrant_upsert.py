@@ -1,12 +1,17 @@
 import os
-import uuid
 import time
-import pdfplumber
 from openai import OpenAI
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http.exceptions import ResponseHandlingException
-from qdrant_client.models import PointStruct, Distance, VectorParams
+from qdrant_client.models import PointStruct, PointIdsList, Distance, VectorParams
+
+from config.tools.sparse_index import BM25Index, sparse_index_path
+from ingestion import (
+    ChunkEmbedder, IngestionPipeline, IngestionTracker, QdrantFingerprintStore,
+    document_fingerprint, extract_pdf_chunks, point_id, sparse_index_for_collection
+)
+from pdf_catalog import file_sha256
 
 # Load environment variables
 load_dotenv()
@@ -20,23 +25,9 @@ qdrant_client = QdrantClient(
     timeout=60  # Increase default timeout to 60 seconds
 )
 
-# Extract text from PDF
+# Extract text from PDF, split into token-bounded chunks
 def extract_text_from_pdf(pdf_path):
-    text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text.append(page_text.strip())
-    return text
-
-# Generate OpenAI embeddings
-def get_openai_embedding(text):
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
+    return extract_pdf_chunks(pdf_path)
 
 def batch_upsert(qdrant, collection_name, points, batch_size=20, max_retries=3):
     """Upload points to Qdrant in batches with retry logic"""
@@ -69,17 +60,25 @@ def load_pdf_to_qdrant(pdf_path, qdrant, collection_name):
         vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
     )
 
-    # Store embeddings
-    points = []
-    for chunk in text_chunks:
-        embedding = get_openai_embedding(chunk)
-        points.append(PointStruct(
-            id=str(uuid.uuid4()),
+    # Store embeddings, embedding the chunks in concurrent batched requests
+    source = os.path.basename(pdf_path)
+    embedder = ChunkEmbedder(client)
+    points = [
+        PointStruct(
+            id=point_id(source, chunk_index, embedder.model),
             vector=embedding,
             payload={"text": chunk}
-        ))
+        )
+        for (chunk_index, chunk), embedding in embedder.embed(enumerate(text_chunks), text_of=lambda item: item[1])
+    ]
     batch_upsert(qdrant, collection_name, points)
 
+    # Rebuild the BM25 index alongside the recreated collection
+    sparse_index = BM25Index()
+    for point in points:
+        sparse_index.add(point.id, point.payload["text"], point.payload)
+    sparse_index.save(sparse_index_path(collection_name))
+
 # Process all PDFs in a directory
 def process_pdfs_in_directory(folder_path, qdrant, collection_name):
     # Create Qdrant collection if it doesn't exist
@@ -97,38 +96,66 @@ def process_pdfs_in_directory(folder_path, qdrant, collection_name):
         return
     
     print(f"Found {len(pdf_files)} PDF files. Processing...")
-    
-    # Process each PDF file
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(folder_path, pdf_file)
-        print(f"Processing {pdf_file}...")
-        
-        try:
-            # Extract text from PDF
-            text_chunks = extract_text_from_pdf(pdf_path)
-            
-            if not text_chunks:
-                print(f"No text was extracted from {pdf_file}")
+
+    # BM25 index over the same chunks, for sparse + dense fusion search
+    sparse_index = sparse_index_for_collection(qdrant, collection_name)
+    embedder = ChunkEmbedder(client)
+    # PDFs already ingested with the same content and model are skipped
+    tracker = IngestionTracker(QdrantFingerprintStore(qdrant, embedder.model), collection_name, embedder.model)
+
+    def jobs():
+        for pdf_file in pdf_files:
+            pdf_path = os.path.join(folder_path, pdf_file)
+            fingerprint = document_fingerprint(file_sha256(pdf_path), tracker.model)
+            if tracker.unchanged(pdf_file, fingerprint):
+                print(f"Skipping {pdf_file} (unchanged since it was ingested)")
                 continue
-            
-            # Store embeddings
-            points = []
-            for chunk in text_chunks:
-                embedding = get_openai_embedding(chunk)
-                points.append(PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=embedding,
-                    payload={"text": chunk, "source": pdf_file}
-                ))
-            
-            if points:
-                batch_upsert(qdrant, collection_name, points)
-                print(f"Successfully processed {pdf_file} and added {len(points)} chunks to {collection_name}")
-        except Exception as e:
-            print(f"Error processing {pdf_file}: {str(e)}")
-            print("Continuing with next file...")
-            continue
+            yield {"pdf_path": pdf_path, "source": pdf_file, "fingerprint": fingerprint}
+
+    def documents(job, text_chunks):
+        if not text_chunks:
+            print(f"No text was extracted from {job['source']}")
+            return []
+        # Chunks of the previous version beyond the new chunk count
+        stale_ids = tracker.begin(job["source"], job["fingerprint"], len(text_chunks))
+        if stale_ids:
+            qdrant.delete(collection_name=collection_name, points_selector=PointIdsList(points=stale_ids))
+            for id_ in stale_ids:
+                sparse_index.remove(id_)
+        print(f"Extracted {job['source']} ({len(text_chunks)} chunks)")
+        return [
+            {"text": chunk, "source": job["source"], "chunk_index": chunk_index}
+            for chunk_index, chunk in enumerate(text_chunks)
+        ]
+
+    def to_point(payload, embedding):
+        return PointStruct(
+            id=point_id(payload["source"], payload["chunk_index"], embedder.model),
+            vector=embedding,
+            payload=payload
+        )
+
+    def after_upsert(batch):
+        for point in batch:
+            sparse_index.add(point.id, point.payload["text"], point.payload)
+        tracker.upserted(point.payload for point in batch)
+
+    # Extraction (in worker processes), embedding and upserting overlap
+    pipeline = IngestionPipeline(
+        embedder,
+        documents=documents,
+        to_point=to_point,
+        upsert=lambda batch: batch_upsert(qdrant, collection_name, batch),
+        after_upsert=after_upsert
+    )
+    report = pipeline.run(jobs())
+    for stage in ("extract", "embed", "upsert"):
+        print(f"{stage}: {report[stage]}")
+    print(f"Added {report['upsert']['items']} chunks to {collection_name} in {report['wall_seconds']}s")
     
+    sparse_index.save(sparse_index_path(collection_name))
+    print(f"Saved BM25 index of {len(sparse_index)} chunks to {sparse_index_path(collection_name)}")
+
     print(f"All PDF files in {folder_path} have been processed.")
 
 # Example usage
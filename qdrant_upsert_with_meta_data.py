@@ -1,12 +1,20 @@
 import os
-import uuid
 import time
-import pdfplumber
 from openai import OpenAI
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http.exceptions import ResponseHandlingException
-from qdrant_client.models import PointStruct, Distance, VectorParams
+from qdrant_client.models import PointStruct, PointIdsList, Distance, VectorParams
+
+from config.tools.sparse_index import sparse_index_path
+from config.tools.hybrid_search import (
+    FILTER_TERMS_VERSION_FIELD, add_filter_terms, ensure_payload_indexes, payload_filter_terms
+)
+from ingestion import (
+    ChunkEmbedder, IngestionPipeline, IngestionTracker, QdrantFingerprintStore, document_fingerprint, point_id,
+    sparse_index_for_collection
+)
+from pdf_catalog import get_pdf_catalog
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 import os.path
@@ -48,24 +56,6 @@ except Exception as e:
     print(f"Error connecting to MongoDB: {e}")
     sys.exit(1)
 
-# Extract text from PDF
-def extract_text_from_pdf(pdf_path):
-    text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text.append(page_text.strip())
-    return text
-
-# Generate OpenAI embeddings
-def get_openai_embedding(text):
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
-
 def batch_upsert(qdrant, collection_name, points, batch_size=20, max_retries=3):
     """Upload points to Qdrant in batches with retry logic"""
     for i in range(0, len(points), batch_size):
@@ -88,10 +78,11 @@ def batch_upsert(qdrant, collection_name, points, batch_size=20, max_retries=3):
 def extract_filename(path):
     return os.path.basename(path)
 
-# Find a file recursively in a directory structure
+# Find a file anywhere in a directory structure
 def find_pdf_file(base_dir, filename):
     """
-    Recursively search for a PDF file with the given filename within a directory structure
+    Look up a PDF file with the given filename within a directory structure.
+    The tree is catalogued once per run (incrementally, from its saved manifest)
     
     Args:
         base_dir (str): The base directory to start the search
@@ -100,10 +91,7 @@ def find_pdf_file(base_dir, filename):
     Returns:
         str: Full path to the file if found, None otherwise
     """
-    for root, dirs, files in os.walk(base_dir):
-        if filename in files:
-            return os.path.join(root, filename)
-    return None
+    return get_pdf_catalog(base_dir).resolve(filename)
 
 # Process civil cases from MongoDB and upsert to Qdrant
 def process_civil_cases(base_pdf_dir, qdrant, collection_name):
@@ -113,6 +101,12 @@ def process_civil_cases(base_pdf_dir, qdrant, collection_name):
             collection_name=collection_name,
             vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
         )
+    # Index the filterable metadata, so filtered searches of the collection work
+    ensure_payload_indexes(qdrant, collection_name)
+    # Chunks stored before their payloads carried the normalized filter terms get them now
+    updated = add_filter_terms(qdrant, collection_name)
+    if updated:
+        print(f"Added filter terms to {updated} stored chunks")
     
     # Query MongoDB for civil cases with case-insensitive search
     case_type_query = {"case_type": {"$regex": "civil", "$options": "i"}}
@@ -124,12 +118,77 @@ def process_civil_cases(base_pdf_dir, qdrant, collection_name):
         return
     
     print(f"Found {count} civil cases. Processing...")
+
+    # BM25 index over the same chunks, for sparse + dense fusion search
+    sparse_index = sparse_index_for_collection(qdrant, collection_name)
+    for payload in sparse_index.payloads:
+        if FILTER_TERMS_VERSION_FIELD not in payload:
+            payload.update(payload_filter_terms(payload))
     
-    # Process each civil case
-    processed_count = 0
-    skipped_count = 0
+    # Extraction (in worker processes), embedding and upserting overlap: chunks
+    # from consecutive cases share token-budgeted embedding requests
+    stats = {"processed": 0, "skipped": 0, "unchanged": 0}
+    embedder = ChunkEmbedder(client)
     
-    for case in civil_cases:
+    # Documents already ingested with the same file, metadata and model are skipped.
+    # Their fingerprints are kept in the collection, so this holds on a fresh checkout too
+    tracker = IngestionTracker(QdrantFingerprintStore(qdrant, embedder.model), collection_name, embedder.model)
+
+    def documents(job, text_chunks):
+        if not text_chunks:
+            print(f"No text was extracted from {job['source']}")
+            stats["skipped"] += 1
+            return []
+        # Chunks of the document's previous version that its new version no longer has
+        stale_ids = tracker.begin(job["source"], job["fingerprint"], len(text_chunks))
+        if stale_ids:
+            qdrant.delete(collection_name=collection_name, points_selector=PointIdsList(points=stale_ids))
+            for id_ in stale_ids:
+                sparse_index.remove(id_)
+        stats["processed"] += 1
+        print(f"Extracted {job['source']} ({len(text_chunks)} chunks)")
+        return [
+            {"text": chunk, **job["metadata"], **payload_filter_terms(job["metadata"]), "chunk_index": chunk_index}
+            for chunk_index, chunk in enumerate(text_chunks)
+        ]
+
+    def to_point(payload, embedding):
+        return PointStruct(
+            id=point_id(payload["source"], payload["chunk_index"], embedder.model),
+            vector=embedding,
+            payload=payload
+        )
+
+    def after_upsert(batch):
+        for point in batch:
+            sparse_index.add(point.id, point.payload["text"], point.payload)
+        tracker.upserted(point.payload for point in batch)
+
+    pipeline = IngestionPipeline(
+        embedder,
+        documents=documents,
+        to_point=to_point,
+        upsert=lambda batch: batch_upsert(qdrant, collection_name, batch),
+        after_upsert=after_upsert
+    )
+    report = pipeline.run(civil_case_jobs(civil_cases, base_pdf_dir, tracker, stats))
+    stats["skipped"] += report["extract"]["failed"]
+    for stage in ("extract", "embed", "upsert"):
+        print(f"{stage}: {report[stage]}")
+    print(f"Added {report['upsert']['items']} chunks to {collection_name} in {report['wall_seconds']}s")
+
+    sparse_index.save(sparse_index_path(collection_name))
+    print(f"Saved BM25 index of {len(sparse_index)} chunks to {sparse_index_path(collection_name)}")
+    # Keep the PDF hashes computed in this run
+    get_pdf_catalog(base_pdf_dir).save()
+
+    print(f"All civil cases have been processed. Successfully processed {stats['processed']} cases, "
+          f"skipped {stats['unchanged']} unchanged and {stats['skipped']} failed cases.")
+
+# Extraction jobs for the new or changed civil cases, with the case metadata for their payload
+def civil_case_jobs(cases, base_pdf_dir, tracker, stats):
+    catalog = get_pdf_catalog(base_pdf_dir)
+    for case in cases:
         # Extract filename from the path
         pdf_filename = extract_filename(case["pdf_file_name"])
         
@@ -138,55 +197,29 @@ def process_civil_cases(base_pdf_dir, qdrant, collection_name):
         
         if not pdf_path:
             print(f"PDF file not found: {pdf_filename}")
-            skipped_count += 1
+            stats["skipped"] += 1
             continue
         
-        print(f"Processing {pdf_filename}...")
+        # Create metadata from MongoDB document
+        metadata = {
+            "case_name": case.get("case_name", ""),
+            "case_number": case.get("case_number", ""),
+            "judges": case.get("judges", []),
+            "case_subtype": case.get("case_subtype", []),
+            "court": case.get("court", ""),
+            "outcome_tags": case.get("outcome_tags", []),
+            "labor_tags": case.get("labor_tags", []),
+            "summary": case.get("summary", ""),
+            "complianceList": case.get("complianceList", []),
+            "source": pdf_filename
+        }
         
-        try:
-            # Extract text from PDF
-            text_chunks = extract_text_from_pdf(pdf_path)
-            
-            if not text_chunks:
-                print(f"No text was extracted from {pdf_filename}")
-                skipped_count += 1
-                continue
-            
-            # Create metadata from MongoDB document
-            metadata = {
-                "case_name": case.get("case_name", ""),
-                "case_number": case.get("case_number", ""),
-                "judges": case.get("judges", []),
-                "case_subtype": case.get("case_subtype", []),
-                "court": case.get("court", ""),
-                "outcome_tags": case.get("outcome_tags", []),
-                "labor_tags": case.get("labor_tags", []),
-                "summary": case.get("summary", ""),
-                "complianceList": case.get("complianceList", []),
-                "source": pdf_filename
-            }
-            
-            # Store embeddings with metadata
-            points = []
-            for chunk in text_chunks:
-                embedding = get_openai_embedding(chunk)
-                points.append(PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=embedding,
-                    payload={"text": chunk, **metadata}
-                ))
-            
-            if points:
-                batch_upsert(qdrant, collection_name, points)
-                print(f"Successfully processed {pdf_filename} and added {len(points)} chunks to {collection_name}")
-                processed_count += 1
-        except Exception as e:
-            print(f"Error processing {pdf_filename}: {str(e)}")
-            print("Continuing with next file...")
-            skipped_count += 1
+        fingerprint = document_fingerprint(catalog.sha256(pdf_filename), tracker.model, metadata)
+        if tracker.unchanged(pdf_filename, fingerprint):
+            stats["unchanged"] += 1
             continue
-    
-    print(f"All civil cases have been processed. Successfully processed {processed_count} cases, skipped {skipped_count} cases.")
+        
+        yield {"pdf_path": pdf_path, "source": pdf_filename, "metadata": metadata, "fingerprint": fingerprint}
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import datetime
+import hashlib
+import os
+from functools import lru_cache
+from typing import Dict, Any, Optional
+
+import pymongo
+
+# Files whose content changes the generated report (agent roles, task prompts)
+CONFIG_FILES = [
+    "config/agents.yaml",
+    "config/tasks.yaml"
+]
+
+# Bump when pipeline code changes the report without touching the YAML configs
+PIPELINE_VERSION = os.getenv("PIPELINE_VERSION", "1")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def config_version() -> str:
+    """
+    Hash of the agent/task configs and the pipeline version.
+    Cached reports are only reused when this matches, so editing a prompt
+    invalidates every cached report automatically.
+    """
+    sha256 = hashlib.sha256(PIPELINE_VERSION.encode("utf-8"))
+    for path in CONFIG_FILES:
+        sha256.update(path.encode("utf-8"))
+        with open(path, "rb") as f:
+            sha256.update(f.read())
+    return sha256.hexdigest()[:16]
+
+
+class ReportCache:
+    """
+    Compliance reports keyed by (PDF content hash, config version), stored in
+    Mongo next to the `legal_documents` collection.
+
+    Works with both pymongo and Motor collections: every method returns the
+    collection call's result, which callers await when the collection is async.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        return self.collection.create_index(
+            [("content_hash", pymongo.ASCENDING), ("config_version", pymongo.ASCENDING)],
+            unique=True,
+            name="content_hash_config_version"
+        )
+
+    def lookup(self, content_hash: str, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached report entry for a document, or None on a miss."""
+        return self.collection.find_one(
+            {"content_hash": content_hash, "config_version": version or config_version()},
+            {"_id": 0}
+        )
+
+    def store(self, content_hash: str, report: str, document_id: str, session_id: str,
+              version: Optional[str] = None):
+        """Store (or replace) the report produced for a document."""
+        version = version or config_version()
+        return self.collection.update_one(
+            {"content_hash": content_hash, "config_version": version},
+            {"$set": {
+                "content_hash": content_hash,
+                "config_version": version,
+                "report": report,
+                "document_id": document_id,
+                "source_session_id": session_id,
+                "created_at": datetime.datetime.now().isoformat()
+            }},
+            upsert=True
+        )
@@ -0,0 +1,265 @@
+import datetime
+import gzip
+import logging
+import os
+import sys
+import zlib
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Any, Optional, List, Tuple
+
+import gridfs
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Per-session log files live next to the job's report and crew log (<dir>/<session_id>/)
+SESSION_LOG_DIR = os.getenv("JOB_OUTPUT_DIR", "job_outputs")
+SESSION_LOG_FILENAME = "session.log"
+# CrewAI's own execution log for the job (see main_exec.job_output_paths)
+CREW_LOG_FILENAME = "main_exec.txt"
+# Bytes of the session log discarded by rotation so far (offsets of the retained bytes start there)
+DROPPED_BYTES_SUFFIX = ".dropped"
+
+# A session's logs, each read with its own byte offsets: the pipeline log and CrewAI's log
+LOG_STREAMS = ("pipeline", "crew")
+
+# Rotation of the local session log
+SESSION_LOG_MAX_BYTES = int(os.getenv("SESSION_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+SESSION_LOG_BACKUP_COUNT = int(os.getenv("SESSION_LOG_BACKUP_COUNT", "3"))
+
+# Upper bound on the (uncompressed) bytes of each log stream kept in Mongo; only the tail is kept beyond this
+SESSION_LOG_STORE_MAX_BYTES = int(os.getenv("SESSION_LOG_STORE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# GridFS bucket holding gzip-compressed session logs, one file per session and stream
+SESSION_LOG_BUCKET = "session_logs"
+
+LOGGER_NAME = "crew_pipeline"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+def session_log_path(session_id: str) -> str:
+    """Path of a session's current log file (rotated backups get a .1, .2, ... suffix)."""
+    return os.path.join(SESSION_LOG_DIR, session_id, SESSION_LOG_FILENAME)
+
+
+def read_dropped_bytes(path: str) -> int:
+    try:
+        with open(path + DROPPED_BYTES_SUFFIX, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+class OffsetRotatingFileHandler(RotatingFileHandler):
+    """
+    Rotating file handler that records how many bytes rotation has discarded,
+    so a byte offset into the log always names the same byte, whichever
+    backup now holds it.
+    """
+
+    def doRollover(self):
+        oldest = f"{self.baseFilename}.{self.backupCount}"
+        if self.backupCount > 0 and os.path.exists(oldest):
+            dropped = read_dropped_bytes(self.baseFilename) + os.path.getsize(oldest)
+            temp = self.baseFilename + DROPPED_BYTES_SUFFIX + ".tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(str(dropped))
+            os.replace(temp, self.baseFilename + DROPPED_BYTES_SUFFIX)
+        super().doRollover()
+
+
+def stream_files(session_id: str, stream: str) -> Tuple[List[Tuple[str, int]], int]:
+    """
+    The existing files of one log stream, oldest first, with their sizes, and
+    the offset of the first byte they hold. The pipeline log starts after the
+    bytes rotation discarded; CrewAI's log is a single append-only file.
+    """
+    if stream == "crew":
+        paths, first = [os.path.join(SESSION_LOG_DIR, session_id, CREW_LOG_FILENAME)], 0
+    else:
+        path = session_log_path(session_id)
+        # Read before listing: a rotation in between then only moves retained bytes later
+        first = read_dropped_bytes(path)
+        paths = [f"{path}.{i}" for i in range(SESSION_LOG_BACKUP_COUNT, 0, -1)] + [path]
+    files = []
+    for path in paths:
+        try:
+            files.append((path, os.path.getsize(path)))
+        except FileNotFoundError:
+            pass
+    return files, first
+
+
+def log_range(first: int, end: int, offset: int, limit: int) -> Tuple[int, int]:
+    """
+    Absolute start and length of `limit` bytes from `offset` in a log holding
+    bytes [first, end). A negative offset counts from the end, so offset=-limit
+    tails the log; offsets before `first` (no longer kept) start at `first`.
+    """
+    start = max(first, end + offset) if offset < 0 else min(max(offset, first), end)
+    return start, min(limit, end - start)
+
+
+def read_range(files: List[Tuple[str, int]], first: int, start: int, length: int) -> bytes:
+    """Bytes [start, start + length) of the files read as one log starting at `first`, seeking to them."""
+    end = start + length
+    chunks = []
+    position = first
+    for path, size in files:
+        if position >= end:
+            break
+        if start < position + size:
+            skip = max(0, start - position)
+            with open(path, "rb") as f:
+                f.seek(skip)
+                chunks.append(f.read(min(size, end - position) - skip))
+        position += size
+    return b"".join(chunks)
+
+
+def read_local_session_log_range(session_id: str, stream: str, offset: int,
+                                 limit: int) -> Optional[Tuple[bytes, int, int, int]]:
+    """
+    A byte range of one of the session's log streams, read from the local
+    files by seeking to it. Returns the bytes, their offset, and the first and
+    end offsets of the log, or None if the stream has no files.
+    """
+    for attempt in range(3):
+        files, first = stream_files(session_id, stream)
+        if not files:
+            return None
+        end = first + sum(size for _, size in files)
+        start, length = log_range(first, end, offset, limit)
+        try:
+            return read_range(files, first, start, length), start, first, end
+        except FileNotFoundError:
+            # Rotated while being read; list the files again
+            continue
+    return None
+
+
+@contextmanager
+def session_logger(session_id: str, extra_handlers: Optional[List[logging.Handler]] = None):
+    """
+    Attach a rotating file handler (plus console and any extra handlers) to the
+    pipeline logger for the duration of one session, and detach and close them
+    all on exit so handlers never accumulate across jobs in a worker.
+    """
+    path = session_log_path(session_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    file_handler = OffsetRotatingFileHandler(
+        path,
+        maxBytes=SESSION_LOG_MAX_BYTES,
+        backupCount=SESSION_LOG_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    console_handler = logging.StreamHandler(sys.stdout)
+    handlers = [file_handler, console_handler] + list(extra_handlers or [])
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    for handler in handlers:
+        handler.setLevel(logging.INFO)
+        logger.addHandler(handler)
+    try:
+        yield logger
+    finally:
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def store_session_log(db, session_id: str) -> Dict[str, Any]:
+    """
+    Compress each of a session's log streams into GridFS, keeping the last
+    SESSION_LOG_STORE_MAX_BYTES of each with the offsets it covers, so offsets
+    read while the job ran still name the same bytes. Returns the fields to
+    record on the session document.
+    """
+    bucket = gridfs.GridFSBucket(db, bucket_name=SESSION_LOG_BUCKET)
+
+    # A retried job replaces the logs stored by the earlier attempt
+    for old in bucket.find({"filename": session_id}):
+        bucket.delete(old._id)
+
+    file_ids = {}
+    stored_size = 0
+    truncated = False
+    for stream in LOG_STREAMS:
+        files, first = stream_files(session_id, stream)
+        if not files:
+            continue
+        end = first + sum(size for _, size in files)
+        start = max(first, end - SESSION_LOG_STORE_MAX_BYTES)
+        data = read_range(files, first, start, end - start)
+        file_id = bucket.upload_from_stream(
+            session_id,
+            gzip.compress(data),
+            metadata={
+                "session_id": session_id,
+                "stream": stream,
+                "encoding": "gzip",
+                "start_offset": start,
+                "size": len(data),
+                "truncated": start > 0,
+                "stored_at": datetime.datetime.now().isoformat()
+            }
+        )
+        file_ids[stream] = str(file_id)
+        stored_size += len(data)
+        truncated = truncated or start > 0
+    return {"log_file_ids": file_ids, "log_size": stored_size, "log_truncated": truncated}
+
+
+async def load_session_log_range(adb, session_id: str, stream: str, offset: int,
+                                 limit: int) -> Optional[Tuple[bytes, int, int, int]]:
+    """
+    A byte range of one of a session's stored log streams from GridFS (Motor).
+    The file is decompressed chunk by chunk as it is downloaded and only the
+    range is kept; the download stops at the end of the range. Returns the
+    bytes, their offset, and the first and end offsets of the stored log, or
+    None if not stored.
+    """
+    from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+    # Logs stored before they were split into streams are the pipeline stream
+    streams = [stream, None] if stream == "pipeline" else [stream]
+    stored = await adb[f"{SESSION_LOG_BUCKET}.files"].find_one(
+        {"filename": session_id, "metadata.stream": {"$in": streams}},
+        sort=[("uploadDate", -1)]
+    )
+    if stored is None:
+        return None
+    bucket = AsyncIOMotorGridFSBucket(adb, bucket_name=SESSION_LOG_BUCKET)
+    download = await bucket.open_download_stream(stored["_id"])
+    metadata = stored.get("metadata") or {}
+    first = metadata.get("start_offset", 0)
+    if "size" not in metadata:
+        data = gzip.decompress(await download.read())
+        content, start = slice_log(data, offset, limit)
+        return content, start, 0, len(data)
+
+    end = first + metadata["size"]
+    start, length = log_range(first, end, offset, limit)
+    stop = start + length
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)  # gzip container
+    chunks = []
+    position = first
+    while position < stop:
+        compressed = await download.readchunk()
+        if not compressed:
+            break
+        data = decompressor.decompress(compressed)
+        if position + len(data) > start:
+            chunks.append(data[max(0, start - position):stop - position])
+        position += len(data)
+    return b"".join(chunks), start, first, end
+
+
+def slice_log(data: bytes, offset: int, limit: int) -> Tuple[bytes, int]:
+    """Return `limit` bytes starting at `offset` (see log_range) and the absolute start offset."""
+    start, length = log_range(0, len(data), offset, limit)
+    return data[start:start + length], start
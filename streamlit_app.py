@@ -4,15 +4,62 @@ import os
 import time
 import datetime
 import json
-from pathlib import Path
-
-# Create uploads directory if it doesn't exist
-UPLOAD_DIR = Path("uploaded_pdfs")
-UPLOAD_DIR.mkdir(exist_ok=True)
 
 # API URL
 API_URL = "http://localhost:8000"
 
+def fetch_job_details(session_id):
+    """Fetch a job's full record (report included once the session is stored) into the job list."""
+    response = requests.get(f"{API_URL}/job-status/{session_id}")
+    if response.status_code != 200:
+        st.error(f"Error fetching job: {response.status_code} - {response.text}")
+        return None
+    job = response.json()
+    st.session_state.jobs[session_id] = job
+    return job
+
+def follow_job_events(session_id):
+    """Show live progress of a job from the API's server-sent event stream."""
+    progress = st.status("Processing document...", expanded=True)
+    final_status = None
+    try:
+        with requests.get(f"{API_URL}/job-events/{session_id}", stream=True, timeout=(5, 600)) as response:
+            if response.status_code != 200:
+                progress.update(label=f"Could not follow job: {response.status_code}", state="error")
+                return
+            event_type = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event_type = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event_type == "status":
+                        progress.write(f"**{data.get('status')}** - {data.get('message', '')}")
+                    elif event_type == "task_started":
+                        progress.write(f"Started: {data.get('agent') or data.get('task')}")
+                    elif event_type == "task_completed":
+                        progress.write(f"Completed: {data.get('agent') or data.get('task')}")
+                    elif event_type == "task_failed":
+                        progress.write(f"Task failed: {data.get('error')}")
+                    elif event_type == "end":
+                        final_status = data.get("status")
+                        break
+    except requests.exceptions.RequestException as e:
+        progress.update(label=f"Lost connection to job stream: {str(e)}", state="error")
+        return
+    
+    if final_status == "success":
+        progress.update(label="Analysis completed", state="complete")
+    else:
+        progress.update(label=f"Analysis finished with status: {final_status}", state="error")
+    
+    # The stream ends once the job is final; its stored session has the report
+    job = fetch_job_details(session_id)
+    if job and job.get("report"):
+        with st.expander("View Report", expanded=True):
+            st.markdown(job["report"])
+    st.write("Check the job in the sidebar for the logs.")
+
 st.title("Legal Document Analysis")
 st.write("Upload a PDF document for legal analysis using CrewAI")
 
@@ -28,48 +75,20 @@ with st.sidebar:
     tab1, tab2 = st.tabs(["Job History", "Documents"])
     
     with tab1:
-        if st.button("Refresh Job List"):
+        refresh_jobs = st.button("Refresh Job List")
+        more_jobs = st.session_state.get("jobs_cursor") and st.button("Load More Jobs")
+        if refresh_jobs or more_jobs:
             try:
-                response = requests.get(f"{API_URL}/jobs")
+                params = {"cursor": st.session_state.jobs_cursor} if more_jobs else {}
+                response = requests.get(f"{API_URL}/jobs", params=params)
                 if response.status_code == 200:
-                    jobs_data = response.json()["jobs"]
-                    for job in jobs_data:
+                    jobs_page = response.json()
+                    for job in jobs_page.get("active_jobs", []) + jobs_page["jobs"]:
                         st.session_state.jobs[job["session_id"]] = job
+                    st.session_state.jobs_cursor = jobs_page.get("next_cursor")
             except Exception as e:
                 st.error(f"Error fetching jobs: {str(e)}")
         
-        # Check log files button
-        if st.button("Check Log Files"):
-            try:
-                with st.spinner("Checking log files..."):
-                    response = requests.get(f"{API_URL}/check-log-file")
-                    if response.status_code == 200:
-                        log_data = response.json()
-                        st.write("### Log File Status")
-                        
-                        # Show current directory
-                        st.write(f"**Current directory:** {log_data['current_directory']}")
-                        
-                        # Show found log files
-                        for file_type, file_paths in log_data['log_files_found'].items():
-                            if file_paths:
-                                st.write(f"**{file_type}** found at:")
-                                for path in file_paths:
-                                    st.write(f"- {path}")
-                            else:
-                                st.write(f"**{file_type}** not found")
-                        
-                        # Show log contents in expandable sections
-                        if log_data['log_contents']:
-                            st.write("### Log Contents")
-                            for file_path, content in log_data['log_contents'].items():
-                                with st.expander(f"Contents of {file_path}"):
-                                    st.code(content)
-                    else:
-                        st.error(f"Error checking log files: {response.status_code} - {response.text}")
-            except Exception as e:
-                st.error(f"Error checking log files: {str(e)}")
-        
         # Show job history
         for session_id, job in st.session_state.jobs.items():
             with st.expander(f"Job: {session_id[:8]} - {job.get('status', 'unknown')}"):
@@ -81,23 +100,44 @@ with st.sidebar:
                 if "agentops_url" in job and job["agentops_url"]:
                     st.write(f"**AgentOps URL:** {job['agentops_url']}")
                 
+                # The job list only holds summaries; fetch logs and report on demand
+                if job.get("status") in ("success", "failed") and "report" not in job:
+                    if st.button("Load Report & Logs", key=f"details_{session_id}"):
+                        job = fetch_job_details(session_id) or job
+                        if "report" not in job:
+                            st.info("The job's session has not been stored yet; try again shortly.")
+                
                 # Show logs and report if available
                 if "log_file" in job and job["log_file"]:
                     with st.expander("View Logs"):
                         st.code(job["log_file"])
+                elif st.button("Show Log Tail", key=f"log_{session_id}"):
+                    for stream, title in (("pipeline", "View Logs"), ("crew", "View Crew Log")):
+                        response = requests.get(f"{API_URL}/session-logs/{session_id}", params={"stream": stream})
+                        if response.status_code == 200:
+                            log_data = response.json()
+                            with st.expander(title, expanded=stream == "pipeline"):
+                                st.caption(f"Bytes {log_data['offset']}-{log_data['next_offset']} of {log_data['total_size']}")
+                                st.code(log_data["content"])
+                        else:
+                            st.error(f"Error fetching logs: {response.status_code} - {response.text}")
                 
                 if "report" in job and job["report"]:
                     with st.expander("View Report"):
                         st.markdown(job["report"])
     
     with tab2:
-        if st.button("Refresh Document List"):
+        refresh_documents = st.button("Refresh Document List")
+        more_documents = st.session_state.get("documents_cursor") and st.button("Load More Documents")
+        if refresh_documents or more_documents:
             try:
-                response = requests.get(f"{API_URL}/documents")
+                params = {"cursor": st.session_state.documents_cursor} if more_documents else {}
+                response = requests.get(f"{API_URL}/documents", params=params)
                 if response.status_code == 200:
-                    documents_data = response.json()["documents"]
-                    for doc in documents_data:
+                    documents_page = response.json()
+                    for doc in documents_page["documents"]:
                         st.session_state.documents[doc["document_id"]] = doc
+                    st.session_state.documents_cursor = documents_page.get("next_cursor")
             except Exception as e:
                 st.error(f"Error fetching documents: {str(e)}")
         
@@ -128,25 +168,25 @@ with col1:
     user_name = st.text_input("Your username", value="testuser")
     
     if uploaded_file is not None:
-        # Save the uploaded file
-        file_path = UPLOAD_DIR / uploaded_file.name
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        st.success(f"File saved: {file_path}")
-        
         # Submit button
         if st.button("Analyze Document"):
             try:
                 with st.spinner("Submitting document for analysis..."):
-                    # Get current date for report_date
-                    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+                    # Upload the PDF to the API (identical files are stored once)
+                    uploaded_file.seek(0)
+                    upload_response = requests.post(
+                        f"{API_URL}/documents",
+                        data={"user_name": user_name},
+                        files={"file": (uploaded_file.name, uploaded_file, "application/pdf")}
+                    )
+                    upload_response.raise_for_status()
+                    document_id = upload_response.json()["document_id"]
                     
                     response = requests.post(
                         f"{API_URL}/analyze-document",
                         json={
                             "user_name": user_name,
-                            "pdf_path": str(file_path)
+                            "document_id": document_id
                         }
                     )
                     
@@ -158,11 +198,9 @@ with col1:
                         st.write(f"Status: {job_data['status']}")
                         st.write(f"Expected completion: {job_data['expected_finish_time']}")
                         
-                        # Start polling for status updates
-                        with st.spinner("Processing document..."):
-                            # Poll for 5 seconds to show it's working
-                            time.sleep(5)
-                            st.write("Document processing has started. Check the job in the sidebar for updates.")
+                        # Follow the job's progress stream instead of polling for status
+                        if job_data["status"] == "queued":
+                            follow_job_events(job_data["session_id"])
                     else:
                         st.error(f"Error: {response.status_code} - {response.text}")
             except Exception as e:
@@ -1,10 +1,15 @@
 import os
+import sys
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 from openai import OpenAI
 import PyPDF2
 from pathlib import Path
 
+# Make the repository root importable when run from this directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from chunking import get_chunker
+
 # Load API keys
 load_dotenv()
 client = OpenAI(
@@ -71,14 +76,15 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     try:
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
+            pages = []
             for page in pdf_reader.pages:
                 # Extract text from page
-                page_text = page.extract_text()
-                # Clean the text while preserving sentence structure
-                page_text = ' '.join(line.strip() for line in page_text.split('\n') if line.strip())
-                text += page_text + " "
-            return text.strip()
+                page_text = page.extract_text() or ""
+                # Clean the text, keeping the line breaks the chunker finds paragraphs by
+                page_text = '\n'.join(line.strip() for line in page_text.split('\n') if line.strip())
+                if page_text:
+                    pages.append(page_text)
+            return '\n\n'.join(pages)
     except Exception as e:
         print(f"Error processing {pdf_path}: {str(e)}")
         return ""
@@ -120,16 +126,8 @@ def process_directory(directory_path: str, namespace: str):
             
         print(f"✓ Extracted {len(text)} characters from {pdf_file.name}")
         
-        # Split text into larger, more meaningful chunks (4000 characters with 200 char overlap)
-        chunk_size = 4000
-        overlap = 200
-        chunks = []
-        
-        for i in range(0, len(text), chunk_size - overlap):
-            chunk = text[i:i + chunk_size]
-            if len(chunk) < 100:  # Skip very small chunks
-                continue
-            chunks.append(chunk)
+        # Split text into token-bounded chunks at paragraph and sentence boundaries
+        chunks = [chunk for chunk in get_chunker().split(text) if len(chunk) >= 100]  # Skip very small chunks
         
         print(f"✓ Split into {len(chunks)} chunks")
         
@@ -4,10 +4,15 @@ from qdrant_client.models import PointStruct, Distance, VectorParams
 import torch
 import uuid
 import os
+import sys
 import openai
 from pypdf import PdfReader
 from openai import OpenAI
 
+# Make the repository root importable when run from this directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from chunking import TokenChunker
+
 # ---------- CONFIGURATION ----------
 COLLECTION_NAME = "legal_chunks"
 MODEL_NAME = "nlpaueb/legal-bert-base-uncased"
@@ -23,12 +28,9 @@ qdrant = QdrantClient(
 )
 
 # ---------- UTILITIES ----------
-def chunk_text(text, chunk_size=200, overlap=50):
-    words = text.split()
-    return [
-        ' '.join(words[i:i+chunk_size])
-        for i in range(0, len(words), chunk_size - overlap)
-    ]
+def chunk_text(text, chunk_size=256, overlap=32):
+    # Sizes in tokens; chunks end at paragraph or sentence boundaries
+    return TokenChunker(max_tokens=chunk_size, overlap_tokens=overlap).split(text)
 
 def get_embedding(text):
     inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
@@ -1,7 +1,6 @@
 import os
 import uuid
 import time
-import pdfplumber
 from openai import OpenAI
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
@@ -14,6 +13,13 @@ import sys
 from transformers import AutoModel, AutoTokenizer
 import torch
 
+# Make the repository root importable when run from this directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from chunking import TokenChunker
+from config.tools.hybrid_search import ensure_payload_indexes
+from ingestion import extract_pdf_chunks
+from pdf_catalog import get_pdf_catalog
+
 # Load environment variables
 load_dotenv()
 
@@ -52,15 +58,13 @@ except Exception as e:
     print(f"Error connecting to MongoDB: {e}")
     sys.exit(1)
 
-# Extract text from PDF
+# legal-bert truncates its input at 512 wordpieces, which run longer than
+# cl100k tokens, so chunks are kept well under that
+legal_bert_chunker = TokenChunker(max_tokens=320, overlap_tokens=40)
+
+# Extract text from PDF, split into chunks legal-bert reads in full
 def extract_text_from_pdf(pdf_path):
-    text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text.append(page_text.strip())
-    return text
+    return extract_pdf_chunks(pdf_path, legal_bert_chunker)
 
 # generate embeddings using legal-bert
 def get_legal_bert_embedding(text):
@@ -93,10 +97,11 @@ def batch_upsert(qdrant, collection_name, points, batch_size=20, max_retries=3):
 def extract_filename(path):
     return os.path.basename(path)
 
-# Find a file recursively in a directory structure
+# Find a file anywhere in a directory structure
 def find_pdf_file(base_dir, filename):
     """
-    Recursively search for a PDF file with the given filename within a directory structure
+    Look up a PDF file with the given filename within a directory structure.
+    The tree is catalogued once per run (incrementally, from its saved manifest)
     
     Args:
         base_dir (str): The base directory to start the search
@@ -105,10 +110,7 @@ def find_pdf_file(base_dir, filename):
     Returns:
         str: Full path to the file if found, None otherwise
     """
-    for root, dirs, files in os.walk(base_dir):
-        if filename in files:
-            return os.path.join(root, filename)
-    return None
+    return get_pdf_catalog(base_dir).resolve(filename)
 
 def get_civil_cases_with_retry(collection, max_retries=3):
     """Get civil cases with retry logic for cursor timeouts"""
@@ -142,6 +144,8 @@ def process_civil_cases(base_pdf_dir, qdrant, collection_name):
             collection_name=collection_name,
             vectors_config=VectorParams(size=768, distance=Distance.COSINE)
         )
+    # Index the judge / case type / tag fields so filtered searches run inside Qdrant
+    ensure_payload_indexes(qdrant, collection_name)
     
     try:
         # Get cursor with retry logic
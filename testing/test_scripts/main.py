@@ -2,6 +2,12 @@ import os
 from openai import OpenAI
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
+from functools import lru_cache
+import sys
+
+# Make the repository root importable when run from this directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from config.tools.reranker import Reranker, LLMScorer
 
 load_dotenv()
 
@@ -56,37 +62,18 @@ def search_legal_clauses(query, top_k=5):
     )
     return [match.metadata['text'] for match in results.matches]
 
+@lru_cache(maxsize=None)
+def get_test_reranker(model):
+    # One reranker (and score cache) per model
+    return Reranker(LLMScorer(model, client=client))
+
 def rerank_results(query, results, model="gpt-3.5-turbo"):
     """
     Rerank the retrieved chunks based on their relevance to the query
+    (all chunks are scored in a single request)
     """
-    if not results:
-        return []
-        
-    # Prepare prompt for reranking
-    rerank_prompt = f"""
-    Rate the relevance of each text to the query: "{query}"
-    Assign a score from 0 to 10, where 10 is most relevant.
-    Return only the score, nothing else.
-    
-    Text: {{text}}
-    """
-    
-    scored_results = []
-    for text in results:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": rerank_prompt.format(text=text)}],
-            max_tokens=10
-        )
-        try:
-            score = float(response.choices[0].message.content.strip())
-            scored_results.append((score, text))
-        except ValueError:
-            scored_results.append((0, text))
-    
-    # Sort by score in descending order and return just the texts
-    return [text for _, text in sorted(scored_results, reverse=True)]
+    reranker = get_test_reranker(model)
+    return [result["text"] for result in reranker.rerank(query, [{"text": text} for text in results])]
 
 def generate_legal_response(query):
     """